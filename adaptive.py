@@ -0,0 +1,227 @@
+import heapq
+import random
+import threading
+import time
+from collections import OrderedDict
+
+from question_bank import facet_keys
+
+# Seconds until a card is due again, by Leitner box. A wrong answer sends
+# the card back to box 0 (due straight away); each right answer moves it
+# up one box.
+INTERVALS = (0, 10 * 60, 60 * 60, 24 * 3600, 3 * 24 * 3600, 7 * 24 * 3600, 30 * 24 * 3600)
+
+
+class Card:
+    __slots__ = ('facets', 'box', 'due', 'attempts', 'correct', 'stamp')
+
+    def __init__(self, facets):
+        self.facets = facets
+        self.box = 0
+        self.due = 0.0
+        self.attempts = 0
+        self.correct = 0
+        self.stamp = 0
+
+    # Lower is weaker: low box first, then low accuracy
+    def weakness(self):
+        return (self.box, self.correct / self.attempts if self.attempts else 0.0)
+
+
+# ---------- PLAYER HISTORY ----------
+# One player's cards plus, for every facet key (subject, topic, difficulty)
+# their answered questions fall under, a min-heap of (due, stamp, qid).
+# Answering a question pushes fresh entries; the old ones are left behind
+# and skipped lazily (their stamp no longer matches the card), and a heap is
+# rebuilt once it holds more than twice as many entries as live cards.
+#
+# Unseen questions are drawn from a per-key shuffle of the pool that is
+# never materialized: the first `left` positions are still in play, and
+# `moved` records only the positions a draw swapped (Fisher-Yates). A drawn
+# question that has been answered meanwhile drops out for good; questions
+# handed out but not answered yet go back in play.
+class PlayerHistory:
+    def __init__(self, bank_version):
+        self.bank_version = bank_version
+        self.cards = {}
+        self.heaps = {}
+        self.seen = {}
+        self.shuffles = {}
+        self._stamp = 0
+
+    def record(self, question, correct, now):
+        card = self._card(question.id, (question.subject, question.topic, question.difficulty))
+        card.attempts += 1
+        if correct:
+            card.correct += 1
+            card.box = min(card.box + 1, len(INTERVALS) - 1)
+        else:
+            card.box = 0
+        card.due = now + INTERVALS[card.box]
+        self._schedule(question.id, card)
+
+    # Takes over another history's cards (a session's answers, once the
+    # player has a name); its cards win over ours for the same question
+    def merge(self, other):
+        for qid, theirs in other.cards.items():
+            card = self._card(qid, theirs.facets)
+            for slot in ('box', 'due', 'attempts', 'correct'):
+                setattr(card, slot, getattr(theirs, slot))
+            self._schedule(qid, card)
+
+    def _card(self, qid, facets):
+        card = self.cards.get(qid)
+        if card is None:
+            card = self.cards[qid] = Card(facets)
+            for key in facet_keys(facets):
+                self.seen[key] = self.seen.get(key, 0) + 1
+        return card
+
+    def _schedule(self, qid, card):
+        self._stamp += 1
+        card.stamp = self._stamp
+        entry = (card.due, card.stamp, qid)
+        for key in facet_keys(card.facets):
+            heap = self.heaps.setdefault(key, [])
+            heapq.heappush(heap, entry)
+            if len(heap) > 2 * self.seen[key] + 16:
+                heap[:] = [e for e in heap if self.cards[e[2]].stamp == e[1]]
+                heapq.heapify(heap)
+
+    # Pops live entries in due order; the caller pushes them back
+    def _pop_live(self, heap):
+        while heap:
+            due, stamp, qid = heapq.heappop(heap)
+            if self.cards[qid].stamp == stamp:
+                return due, stamp, qid
+        return None
+
+    # (due now, weakest first; due later, soonest first) within the first
+    # `window` live entries for this facet key
+    def reviews(self, key, now, window):
+        heap = self.heaps.get(key)
+        if not heap:
+            return [], []
+        due_now, later, popped = [], [], []
+        while len(due_now) + len(later) < window:
+            entry = self._pop_live(heap)
+            if entry is None:
+                break
+            popped.append(entry)
+            (due_now if entry[0] <= now else later).append(entry[2])
+        for entry in popped:
+            heapq.heappush(heap, entry)
+        due_now.sort(key=lambda qid: self.cards[qid].weakness())
+        return due_now, later
+
+    # Up to k random unseen questions from pool (the ids under key). Each
+    # answered question is drawn at most once more before it drops out, so
+    # picking k costs O(k) amortized however much of the pool is seen.
+    def unseen(self, pool, key, k):
+        missing = len(pool) - self.seen.get(key, 0)
+        if k <= 0 or missing <= 0:
+            return []
+        shuffle = self.shuffles.get(key)
+        if shuffle is None:
+            shuffle = self.shuffles[key] = [len(pool), {}]
+        left, moved = shuffle
+        picked = []
+        while len(picked) < k and left > 0:
+            left -= 1
+            _swap(moved, random.randrange(left + 1), left)
+            qid = pool[moved.get(left, left)]
+            if qid not in self.cards:
+                picked.append(left)
+            else:
+                moved.pop(left, None)
+        # Put the picks back in play, right after the positions still in play
+        for i, position in enumerate(reversed(picked)):
+            _swap(moved, left + i, position)
+        shuffle[0] = left + len(picked)
+        return [pool[moved.get(left + i, left + i)] for i in range(len(picked))]
+
+
+def _swap(moved, i, j):
+    a, b = moved.get(i, i), moved.get(j, j)
+    for position, value in ((i, b), (j, a)):
+        if position == value:
+            moved.pop(position, None)
+        else:
+            moved[position] = value
+
+
+# ---------- ADAPTIVE SELECTOR ----------
+# Builds quizzes from a player's history instead of a uniform sample: cards
+# that are due come first (weakest first), then questions the player has not
+# seen, then the cards due soonest. At least `new_share` of a quiz is kept
+# for unseen questions while any are left. Selecting k questions touches
+# O(k log n) heap entries, independent of bank size and history length.
+#
+# Question ids are positions in a bank, so a player's history belongs to
+# one bank version and starts afresh when the bank is reloaded. Histories
+# live in memory, least recently used players are dropped past max_players.
+class AdaptiveSelector:
+    def __init__(self, max_players=10000, new_share=0.3, window=4, clock=time.time):
+        self.max_players = max_players
+        self.new_share = new_share
+        self.window = window
+        self.clock = clock
+        self._players = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._players)
+
+    def _history(self, player, bank_version):
+        history = self._players.get(player)
+        if history is None or history.bank_version != bank_version:
+            history = self._players[player] = PlayerHistory(bank_version)
+            while len(self._players) > self.max_players:
+                self._players.popitem(last=False)
+        self._players.move_to_end(player)
+        return history
+
+    def record(self, player, bank_version, question, correct):
+        with self._lock:
+            self._history(player, bank_version).record(question, correct, self.clock())
+
+    # A whole exam's answers under one lock
+    def record_many(self, player, bank_version, questions, correct):
+        now = self.clock()
+        with self._lock:
+            history = self._history(player, bank_version)
+            for question, ok in zip(questions, correct):
+                history.record(question, bool(ok), now)
+
+    def select(self, player, bank_version, bank, k, subject=None, topic=None, difficulty=None):
+        key = (subject, topic, difficulty)
+        pool = bank.ids(subject, topic, difficulty)
+        with self._lock:
+            history = self._history(player, bank_version)
+            if not history.cards:
+                return random.sample(pool, min(k, len(pool)))
+            due_now, later = history.reviews(key, self.clock(), self.window * k)
+            max_reviews = k - int(round(k * self.new_share))
+            picked = due_now[:max_reviews]
+            picked += history.unseen(pool, key, k - len(picked))
+            for qid in due_now[max_reviews:] + later:
+                if len(picked) >= k:
+                    break
+                picked.append(qid)
+        random.shuffle(picked)
+        return picked
+
+    # Moves a history to a new player key, merging if that player exists
+    def rename(self, old, new):
+        if old == new:
+            return
+        with self._lock:
+            history = self._players.pop(old, None)
+            if history is None:
+                return
+            existing = self._players.get(new)
+            if existing is not None and existing.bank_version == history.bank_version:
+                existing.merge(history)
+            else:
+                self._players[new] = history
+            self._players.move_to_end(new)
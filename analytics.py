@@ -0,0 +1,203 @@
+import argparse
+import hashlib
+import sqlite3
+import sys
+import threading
+import time
+
+
+# Stable across bank reloads and recompiles, unlike question ids (positions)
+def question_key(question):
+    text = f"{question.subject}\x1f{question.question}"
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+# One answer as a plain dict, so it can sit in a WriteBehindQueue spill file
+def answer_event(question, answer, correct, player=None, quiz=None, ts=None):
+    try:
+        chosen = question.options.index(answer)
+    except ValueError:
+        chosen = -1
+    return {
+        'ts': ts if ts is not None else time.time(),
+        'player': player,
+        'quiz': quiz,
+        'key': question_key(question),
+        'subject': question.subject,
+        'topic': question.topic,
+        'difficulty': question.difficulty,
+        'question': question.question,
+        'options': list(question.options),
+        'correct_option': question.correct_option,
+        'chosen': chosen,
+        'correct': bool(correct),
+    }
+
+
+# ---------- ANSWER STORE ----------
+# Every answer is appended to `answers`, and the same write folds it into
+# running totals per question, per option and per subject. Each batch is
+# pre-aggregated in Python and applied with one upsert per touched row, so
+# reports read a few summary rows instead of scanning the answer log.
+class AnswerStore:
+    def __init__(self, path="analytics.db"):
+        self.path = path
+        self._local = threading.local()
+        self._conn().executescript("""
+            CREATE TABLE IF NOT EXISTS answers (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                ts REAL NOT NULL,
+                player TEXT,
+                quiz TEXT,
+                question_key TEXT NOT NULL,
+                chosen INTEGER NOT NULL,
+                correct INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS question_stats (
+                question_key TEXT PRIMARY KEY,
+                subject TEXT NOT NULL,
+                topic TEXT,
+                difficulty TEXT,
+                question TEXT NOT NULL,
+                correct_option INTEGER NOT NULL,
+                attempts INTEGER NOT NULL,
+                correct INTEGER NOT NULL,
+                last_ts REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_question_stats_subject ON question_stats (subject);
+            CREATE TABLE IF NOT EXISTS option_stats (
+                question_key TEXT NOT NULL,
+                option_index INTEGER NOT NULL,
+                option_text TEXT NOT NULL,
+                picks INTEGER NOT NULL,
+                PRIMARY KEY (question_key, option_index)
+            );
+            CREATE TABLE IF NOT EXISTS subject_stats (
+                subject TEXT PRIMARY KEY,
+                attempts INTEGER NOT NULL,
+                correct INTEGER NOT NULL
+            );
+        """)
+        # Databases created before answers carried a quiz id
+        columns = [row[1] for row in self._conn().execute("PRAGMA table_info(answers)")]
+        if 'quiz' not in columns:
+            with self._conn() as conn:
+                conn.execute("ALTER TABLE answers ADD COLUMN quiz TEXT")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def write_events(self, events):
+        questions, options, subjects = {}, {}, {}
+        for e in events:
+            q = questions.get(e['key'])
+            if q is None:
+                q = questions[e['key']] = [e['subject'], e.get('topic'), e.get('difficulty'),
+                                           e['question'], e['correct_option'], 0, 0, 0.0]
+            q[5] += 1
+            q[6] += int(e['correct'])
+            q[7] = max(q[7], e['ts'])
+            if 0 <= e['chosen'] < len(e['options']):
+                option = (e['key'], e['chosen'])
+                if option not in options:
+                    options[option] = [e['options'][e['chosen']], 0]
+                options[option][1] += 1
+            s = subjects.setdefault(e['subject'], [0, 0])
+            s[0] += 1
+            s[1] += int(e['correct'])
+
+        conn = self._conn()
+        with conn:
+            conn.executemany(
+                "INSERT INTO answers (ts, player, quiz, question_key, chosen, correct) VALUES (?, ?, ?, ?, ?, ?)",
+                [(e['ts'], e.get('player'), e.get('quiz'), e['key'], e['chosen'], int(e['correct']))
+                 for e in events])
+            conn.executemany("""
+                INSERT INTO question_stats
+                    (question_key, subject, topic, difficulty, question, correct_option,
+                     attempts, correct, last_ts)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (question_key) DO UPDATE SET
+                    correct_option = excluded.correct_option,
+                    attempts = attempts + excluded.attempts,
+                    correct = correct + excluded.correct,
+                    last_ts = max(last_ts, excluded.last_ts)
+            """, [(key, *values) for key, values in questions.items()])
+            conn.executemany("""
+                INSERT INTO option_stats (question_key, option_index, option_text, picks)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (question_key, option_index) DO UPDATE SET
+                    picks = picks + excluded.picks,
+                    option_text = excluded.option_text
+            """, [(key, index, text, picks) for (key, index), (text, picks) in options.items()])
+            conn.executemany("""
+                INSERT INTO subject_stats (subject, attempts, correct) VALUES (?, ?, ?)
+                ON CONFLICT (subject) DO UPDATE SET
+                    attempts = attempts + excluded.attempts,
+                    correct = correct + excluded.correct
+            """, [(subject, *values) for subject, values in subjects.items()])
+
+    # ---------- REPORTS ----------
+    # Hardest questions first (lowest share answered correctly)
+    def question_report(self, subject=None, min_attempts=1, limit=50):
+        sql = ("SELECT question_key, subject, question, attempts, correct, "
+               "1.0 * correct / attempts AS accuracy FROM question_stats WHERE attempts >= ?")
+        params = [min_attempts]
+        if subject is not None:
+            sql += " AND subject = ?"
+            params.append(subject)
+        sql += " ORDER BY accuracy, attempts DESC LIMIT ?"
+        params.append(limit)
+        cur = self._conn().execute(sql, params)
+        return [dict(zip(('key', 'subject', 'question', 'attempts', 'correct', 'accuracy'), row))
+                for row in cur]
+
+    # How often each option was picked, as a share of all attempts
+    def distractors(self, key):
+        cur = self._conn().execute("""
+            SELECT o.option_index, o.option_text, o.option_index = q.correct_option,
+                   o.picks, 1.0 * o.picks / q.attempts
+            FROM option_stats o JOIN question_stats q USING (question_key)
+            WHERE o.question_key = ? ORDER BY o.option_index
+        """, (key,))
+        return [dict(zip(('index', 'option', 'correct', 'picks', 'rate'), row)) for row in cur]
+
+    def subject_accuracy(self):
+        cur = self._conn().execute(
+            "SELECT subject, attempts, correct, 1.0 * correct / attempts FROM subject_stats ORDER BY subject")
+        return [dict(zip(('subject', 'attempts', 'correct', 'accuracy'), row)) for row in cur]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Answer analytics for teachers.")
+    parser.add_argument("--db", default="analytics.db")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("subjects", help="accuracy per subject")
+    questions = commands.add_parser("questions", help="hardest questions first, with distractor rates")
+    questions.add_argument("--subject")
+    questions.add_argument("--min-attempts", type=int, default=5)
+    questions.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    store = AnswerStore(args.db)
+    if args.command == "subjects":
+        for row in store.subject_accuracy():
+            print(f"{row['subject']:<20} {row['accuracy']:6.1%}  ({row['attempts']} answers)")
+        return 0
+
+    for row in store.question_report(args.subject, args.min_attempts, args.limit):
+        print(f"{row['accuracy']:6.1%}  ({row['attempts']} answers)  [{row['subject']}] {row['question']}")
+        for option in store.distractors(row['key']):
+            mark = "*" if option['correct'] else " "
+            print(f"      {mark} {option['rate']:6.1%}  {option['option']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
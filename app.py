@@ -1,10 +1,32 @@
 import streamlit as st
+import streamlit.components.v1 as components
 import pandas as pd
 import random
 import json
+import html
+import os
+import glob
+import time
+import uuid
 from datetime import datetime
 import gspread
 from oauth2client.service_account import ServiceAccountCredentials
+from write_behind import WriteBehindQueue
+from journal import Journal
+from background import owner_alive
+from io_pool import IOPool, Revalidator, wait
+from leaderboard import IncrementalLeaderboard
+from storage import HEADER, create_backend, pad_row
+from sheets_client import ManagedSheet
+from adaptive import AdaptiveSelector
+from analytics import AnswerStore, answer_event
+from shared_state import SharedState
+from quiz_state import UNANSWERED, QuizState, SnapshotStore
+from assets import build_stylesheet, static_css_supported
+from question_bank import (BankReloader, LazyQuestionBank, QuestionBank, QuestionBankError,
+                           validate_questions)
+from metrics import (Registry, RerunTimer, cached_call, instrument_calls, note_miss,
+                     start_file_writer, start_http_server)
 
 # ---------- PAGE CONFIG ----------
 st.set_page_config(
@@ -14,399 +36,60 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# ---------- METRICS ----------
+# Counters and histograms live for the whole process. Export them with
+#   [metrics]
+#   port = 9108               # serves http://127.0.0.1:9108/metrics
+#   file = "metrics.prom"     # or rewrites this file every 15 seconds
+#   debug_panel = true        # or add ?debug=1 to the URL
+# (SAINSQUIZ_METRICS_PORT / SAINSQUIZ_METRICS_FILE override secrets.toml)
+def get_metrics_config():
+    try:
+        config = dict(st.secrets.get("metrics", {}))
+    except:
+        config = {}
+    config["port"] = os.environ.get("SAINSQUIZ_METRICS_PORT") or config.get("port")
+    config["file"] = os.environ.get("SAINSQUIZ_METRICS_FILE") or config.get("file")
+    return config
+
+@st.cache_resource
+def get_metrics():
+    registry = Registry()
+    registry.describe("sainsquiz_phase_seconds", "Time spent in each phase of a script rerun")
+    registry.describe("sainsquiz_rerun_seconds", "Wall time of complete script reruns")
+    registry.describe("sainsquiz_cache_requests_total", "Cached function calls by result")
+    registry.describe("sainsquiz_external_calls_total", "Calls to the leaderboard storage backend")
+    config = get_metrics_config()
+    try:
+        if config["port"]:
+            start_http_server(registry, config["port"])
+        if config["file"]:
+            start_file_writer(registry, config["file"])
+    except OSError:
+        pass
+    return registry
+
+metrics = get_metrics()
+perf = RerunTimer(metrics)
+
 # ---------- CLEAN PROFESSIONAL CSS ----------
-st.markdown("""
-<style>
-    /* Import Google Font */
-    @import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700&display=swap');
-    
-    * {
-        font-family: 'Inter', sans-serif;
-        margin: 0;
-        padding: 0;
-        box-sizing: border-box;
-    }
-    
-    /* Clean background */
-    .stApp {
-        background-color: #f8fafc;
-    }
-    
-    /* Header */
-    .header {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        padding: 2rem;
-        border-radius: 20px;
-        box-shadow: 0 10px 30px rgba(0,0,0,0.15);
-        margin-bottom: 2rem;
-        text-align: center;
-        color: white;
-    }
-    
-    .header h1 {
-        color: white;
-        font-size: 2.5rem;
-        font-weight: 700;
-        margin-bottom: 0.5rem;
-        text-shadow: 2px 2px 4px rgba(0,0,0,0.2);
-    }
-    
-    .header p {
-        color: rgba(255,255,255,0.9);
-        font-size: 1rem;
-    }
-    
-    /* Subject cards */
-    .subject-card {
-        background: white;
-        padding: 1.5rem;
-        border-radius: 16px;
-        text-align: center;
-        border: 1px solid #e5e7eb;
-        box-shadow: 0 4px 6px rgba(0,0,0,0.05);
-        transition: transform 0.3s ease, box-shadow 0.3s ease;
-        cursor: pointer;
-    }
-    
-    .subject-card:hover {
-        transform: translateY(-5px);
-        box-shadow: 0 10px 25px rgba(0,0,0,0.1);
-    }
-    
-    .subject-card h3 {
-        color: #1f2937;
-        font-size: 1.2rem;
-        font-weight: 600;
-        margin: 0.75rem 0 0.25rem;
-    }
-    
-    .subject-card p {
-        color: #6b7280;
-        font-size: 0.85rem;
-    }
-    
-    .subject-icon {
-        font-size: 2.5rem;
-        margin-bottom: 0.5rem;
-    }
-    
-    /* Question box */
-    .question-box {
-        background: white;
-        padding: 2rem;
-        border-radius: 20px;
-        border: 1px solid #e5e7eb;
-        box-shadow: 0 8px 20px rgba(0,0,0,0.05);
-        margin-bottom: 1.5rem;
-    }
-    
-    .question-header {
-        display: flex;
-        justify-content: space-between;
-        align-items: center;
-        margin-bottom: 1.5rem;
-    }
-    
-    .question-number {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        color: white;
-        padding: 0.5rem 1rem;
-        border-radius: 30px;
-        font-weight: 600;
-        font-size: 0.9rem;
-        box-shadow: 0 2px 5px rgba(102, 126, 234, 0.3);
-    }
-    
-    .question-progress {
-        background: #f1f5f9;
-        color: #475569;
-        padding: 0.5rem 1rem;
-        border-radius: 30px;
-        font-weight: 500;
-        font-size: 0.9rem;
-    }
-    
-    .question-box h3 {
-        color: #667eea;
-        font-size: 0.9rem;
-        text-transform: uppercase;
-        letter-spacing: 0.5px;
-        margin-bottom: 0.75rem;
-    }
-    
-    .question-text {
-        color: #1e293b;
-        font-size: 1.3rem;
-        font-weight: 600;
-        line-height: 1.6;
-        margin: 1rem 0;
-    }
-    
-    .subject-tag {
-        display: inline-block;
-        background: #f1f5f9;
-        color: #475569;
-        padding: 0.3rem 1.2rem;
-        border-radius: 30px;
-        font-size: 0.8rem;
-        font-weight: 600;
-        margin-top: 0.5rem;
-    }
-    
-    /* Options styling */
-    div.row-widget.stRadio > div {
-        display: flex;
-        flex-direction: column;
-        gap: 0.8rem;
-        padding: 0.5rem 0;
-    }
-    
-    div.row-widget.stRadio label {
-        background: white !important;
-        border: 2px solid #e2e8f0 !important;
-        border-radius: 12px !important;
-        padding: 1rem 1.5rem !important;
-        color: #1e293b !important;
-        font-weight: 500 !important;
-        font-size: 1rem !important;
-        transition: all 0.3s ease !important;
-        box-shadow: 0 2px 4px rgba(0,0,0,0.02) !important;
-    }
-    
-    div.row-widget.stRadio label:hover {
-        border-color: #667eea !important;
-        background: #f8fafc !important;
-        transform: translateX(5px);
-        box-shadow: 0 4px 12px rgba(102, 126, 234, 0.1) !important;
-    }
-    
-    div.row-widget.stRadio label[data-baseweb="radio"] input:checked + div {
-        background-color: #667eea !important;
-        border-color: #667eea !important;
-    }
-    
-    /* Button container */
-    .button-container {
-        display: flex;
-        gap: 1rem;
-        margin-top: 1.5rem;
-    }
-    
-    /* Primary button */
-    .stButton button {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%) !important;
-        color: white !important;
-        font-weight: 600 !important;
-        border: none !important;
-        border-radius: 12px !important;
-        padding: 0.8rem 1.5rem !important;
-        font-size: 1rem !important;
-        transition: all 0.3s ease !important;
-        box-shadow: 0 4px 15px rgba(102, 126, 234, 0.3) !important;
-        width: 100%;
-    }
-    
-    .stButton button:hover {
-        transform: translateY(-2px) !important;
-        box-shadow: 0 8px 25px rgba(102, 126, 234, 0.4) !important;
-    }
-    
-    .stButton button:disabled {
-        opacity: 0.5;
-        cursor: not-allowed;
-    }
-    
-    /* Secondary button */
-    .secondary-button button {
-        background: white !important;
-        color: #667eea !important;
-        border: 2px solid #667eea !important;
-        box-shadow: none !important;
-    }
-    
-    .secondary-button button:hover {
-        background: #f8fafc !important;
-        transform: translateY(-2px) !important;
-    }
-    
-    /* Sidebar */
-    [data-testid="stSidebar"] {
-        background: linear-gradient(180deg, #ffffff 0%, #f8fafc 100%);
-        border-right: 1px solid #e2e8f0;
-        padding: 2rem 1rem;
-    }
-    
-    .sidebar-header {
-        text-align: center;
-        margin-bottom: 2rem;
-    }
-    
-    .sidebar-header h2 {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        -webkit-background-clip: text;
-        -webkit-text-fill-color: transparent;
-        font-size: 2rem;
-        font-weight: 700;
-    }
-    
-    /* Metric cards */
-    [data-testid="stMetric"] {
-        background: white;
-        padding: 1.2rem;
-        border-radius: 16px;
-        border: 1px solid #e2e8f0;
-        box-shadow: 0 4px 6px rgba(0,0,0,0.02);
-    }
-    
-    [data-testid="stMetric"] label {
-        color: #64748b !important;
-        font-size: 0.9rem !important;
-        font-weight: 500 !important;
-    }
-    
-    [data-testid="stMetric"] [data-testid="stMetricValue"] {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        -webkit-background-clip: text;
-        -webkit-text-fill-color: transparent;
-        font-size: 2rem !important;
-        font-weight: 700 !important;
-    }
-    
-    /* Progress bar */
-    .stProgress > div > div {
-        background: linear-gradient(90deg, #667eea 0%, #764ba2 100%);
-        border-radius: 10px;
-    }
-    
-    /* Leaderboard */
-    .leaderboard-title {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        color: white;
-        padding: 1rem;
-        border-radius: 12px;
-        text-align: center;
-        margin-bottom: 1.5rem;
-        font-weight: 600;
-    }
-    
-    .leaderboard-item {
-        background: white;
-        padding: 0.8rem 1rem;
-        border-radius: 12px;
-        margin: 0.5rem 0;
-        display: flex;
-        align-items: center;
-        border: 1px solid #e2e8f0;
-        transition: transform 0.2s ease;
-    }
-    
-    .leaderboard-item:hover {
-        transform: translateX(5px);
-        border-color: #667eea;
-    }
-    
-    .leaderboard-rank {
-        font-weight: 700;
-        min-width: 40px;
-        text-align: center;
-    }
-    
-    .rank-1 { color: #FFD700; font-size: 1.2rem; }
-    .rank-2 { color: #C0C0C0; font-size: 1.1rem; }
-    .rank-3 { color: #CD7F32; font-size: 1.1rem; }
-    
-    .leaderboard-name {
-        color: #1e293b;
-        font-weight: 500;
-        flex: 1;
-        margin: 0 0.5rem;
-    }
-    
-    .leaderboard-score {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        color: white;
-        font-weight: 600;
-        padding: 0.3rem 0.8rem;
-        border-radius: 30px;
-        font-size: 0.85rem;
-        min-width: 45px;
-        text-align: center;
-    }
-    
-    .leaderboard-empty {
-        background: #f8fafc;
-        border: 2px dashed #cbd5e1;
-        padding: 2rem;
-        border-radius: 12px;
-        text-align: center;
-        color: #64748b;
-    }
-    
-    /* Feedback messages */
-    .feedback-correct {
-        background: linear-gradient(135deg, #10b981 0%, #059669 100%);
-        color: white;
-        padding: 1.2rem;
-        border-radius: 12px;
-        margin: 1rem 0;
-        box-shadow: 0 4px 15px rgba(16, 185, 129, 0.2);
-    }
-    
-    .feedback-wrong {
-        background: linear-gradient(135deg, #ef4444 0%, #dc2626 100%);
-        color: white;
-        padding: 1.2rem;
-        border-radius: 12px;
-        margin: 1rem 0;
-        box-shadow: 0 4px 15px rgba(239, 68, 68, 0.2);
-    }
-    
-    /* Score card */
-    .score-card {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        color: white;
-        padding: 2rem;
-        border-radius: 20px;
-        text-align: center;
-        margin-bottom: 2rem;
-        box-shadow: 0 10px 30px rgba(102, 126, 234, 0.3);
-    }
-    
-    .score-number {
-        font-size: 4rem;
-        font-weight: 700;
-        line-height: 1;
-        margin: 1rem 0;
-    }
-    
-    .score-percentage {
-        font-size: 1.5rem;
-        opacity: 0.9;
-    }
-    
-    /* Review section */
-    .review-item {
-        background: white;
-        padding: 1rem;
-        border-radius: 12px;
-        margin: 0.5rem 0;
-        border-left: 4px solid;
-    }
-    
-    .review-correct { border-left-color: #10b981; }
-    .review-wrong { border-left-color: #ef4444; }
-    
-    /* Footer */
-    .footer {
-        text-align: center;
-        padding: 2rem 0 1rem;
-        color: #94a3b8;
-        font-size: 0.85rem;
-        border-top: 1px solid #e2e8f0;
-        margin-top: 2rem;
-    }
-</style>
-""", unsafe_allow_html=True)
+# The stylesheet lives in assets/style.css. It is minified and written to
+# static/ under a content hash once per process, so each rerun only sends a
+# <link> instead of the whole stylesheet. It is inlined instead without
+# static serving (see .streamlit/config.toml), without a writable static/
+# folder, or on a Streamlit that serves it as text/plain (see assets.py).
+@st.cache_resource
+def get_stylesheet():
+    note_miss()
+    url, css = build_stylesheet()
+    return (url if static_css_supported() else None), css
+
+style_url, style_css = cached_call(metrics, "stylesheet", get_stylesheet)
+if style_url and st.get_option("server.enableStaticServing"):
+    st.markdown(f'<link rel="stylesheet" href="{style_url}">', unsafe_allow_html=True)
+else:
+    st.markdown(f"<style>{style_css}</style>", unsafe_allow_html=True)
+perf.lap("css")
 
 # ---------- SIMPLE ICONS ----------
 PHYSICS_ICON = "⚡"
@@ -416,37 +99,93 @@ LOGO_ICON = "🎓"
 
 # ---------- INITIALIZE SESSION STATE ----------
 def init_session_state():
+    # The quiz in progress is one compact QuizState (see quiz_state.py)
     defaults = {
-        'score': 0,
-        'q_index': 0,
-        'answers': [],
-        'quiz_started': False,
+        'quiz': None,
         'subject': "All",
+        'difficulty': None,
         'feedback': None,
-        'leaderboard': [],
-        'questions': [],
-        'total_questions': 0,
-        'show_feedback': False,
-        'current_answer': None,
-        'answer_submitted': False
+        'player': None,
+        'show_feedback': False
     }
     
     for key, value in defaults.items():
         if key not in st.session_state:
             st.session_state[key] = value
+    
+    # Adaptive history is kept under this session until a score is saved
+    # under a name (see save_score)
+    if st.session_state.player is None:
+        st.session_state.player = uuid.uuid4().hex
 
 init_session_state()
 
+# ---------- QUIZ SNAPSHOTS ----------
+# The quiz in progress is saved to local disk after every step and its id
+# is put in the page URL as ?quiz=, so the new session that a websocket
+# reconnect or a server restart starts picks the quiz up where it was
+@st.cache_resource
+def get_snapshot_store():
+    store = SnapshotStore("quiz_snapshots.db")
+    metrics.add_collector(lambda: [("sainsquiz_quiz_snapshots", store.count(), {})])
+    return store
+
+def snapshot_quiz():
+    quiz = st.session_state.quiz
+    try:
+        get_snapshot_store().save(quiz)
+        if st.query_params.get("quiz") != quiz.quiz_id:
+            st.query_params["quiz"] = quiz.quiz_id
+    except:
+        pass
+
+# The quiz stays on screen but can no longer be resumed (its score is saved)
+def forget_snapshot(quiz):
+    if "quiz" in st.query_params:
+        del st.query_params["quiz"]
+    try:
+        get_snapshot_store().delete(quiz.quiz_id)
+    except:
+        pass
+
+def end_quiz():
+    quiz = st.session_state.quiz
+    st.session_state.quiz = None
+    if quiz is not None:
+        forget_snapshot(quiz)
+
+def resume_quiz():
+    quiz_id = st.query_params.get("quiz")
+    if st.session_state.quiz is not None or not quiz_id:
+        return
+    try:
+        quiz = get_snapshot_store().load(quiz_id)
+    except:
+        quiz = None
+    if quiz is None:
+        del st.query_params["quiz"]
+        return
+    st.session_state.quiz = quiz
+    st.session_state.player = quiz.player
+    st.session_state.subject = quiz.subject or "All"
+
+resume_quiz()
+
 # ---------- LOAD QUESTIONS ----------
-@st.cache_data(ttl=3600)
+# Not cached on its own: the parsed list only feeds get_question_bank, which
+# keeps one shared compact copy instead of pickling the list on every access.
+# A missing file falls back to the defaults below, but a broken one is an
+# error rather than a silent swap to five questions.
 def load_questions():
     try:
-        with open("questions.json", "r") as f:
+        with open("questions.json", "r", encoding="utf-8") as f:
             questions = json.load(f)
-            if questions:
-                return questions
-    except:
-        pass
+    except FileNotFoundError:
+        questions = None
+    except ValueError as e:
+        raise QuestionBankError(f"questions.json is not valid JSON: {e}") from e
+    if questions:
+        return validate_questions(questions)[0]
     
     # Default questions
     return [
@@ -487,69 +226,519 @@ def load_questions():
         }
     ]
 
-questions_db = load_questions()
+# A compiled bank (python question_bank.py compile) is opened lazily: only
+# the index is read at startup and questions are parsed when first shown.
+# It was validated when compiled, so loading it does no per-question checks,
+# but it must still match questions.json.
+def build_question_bank():
+    if os.path.exists("questions.jsonl") and os.path.exists("questions.idx"):
+        return LazyQuestionBank("questions.jsonl", source_path="questions.json")
+    return QuestionBank(load_questions())
+
+# ---------- SHARED STATE ----------
+# Values every `streamlit run app.py` worker on this host agrees on live in
+# shared_state.db (see shared_state.py)
+@st.cache_resource
+def get_shared_state():
+    note_miss()
+    return SharedState("shared_state.db")
+
+# Bank versions are content hashes, so all workers serving the same files
+# use the same version. A worker that reloads the bank publishes the new
+# version; the others check their files on their next rerun instead of
+# waiting out the stat interval.
+def publish_bank_version(version):
+    try:
+        get_shared_state().set("bank_version", version)
+    except:
+        pass
+
+def published_bank_version():
+    try:
+        shared = get_shared_state()
+        return shared.get("bank_version") if shared.changed() else None
+    except:
+        return None
+
+# Edits to the bank files are picked up within a few seconds and rebuilt in
+# the background; quizzes in progress keep reading the version they began on
+@st.cache_resource
+def get_question_bank():
+    note_miss()
+    return BankReloader(build_question_bank,
+                        ["questions.json", "questions.jsonl", "questions.idx"],
+                        on_reload=publish_bank_version)
+
+try:
+    with perf.phase("load_questions"):
+        bank_reloader = cached_call(metrics, "question_bank", get_question_bank)
+        published = published_bank_version()
+        bank_reloader.check(force=published not in (None, bank_reloader.version))
+except QuestionBankError as e:
+    st.error(f"❌ The question bank could not be loaded.\n\n{e}")
+    st.stop()
+
+bank_version, question_bank = bank_reloader.latest()
+
+quiz = st.session_state.quiz
+if quiz is not None:
+    quiz_bank = bank_reloader.get(quiz.bank_version)
+    if quiz_bank is None:
+        end_quiz()
+        quiz = None
+        st.info("🔄 The question bank was updated. Please start a new quiz.")
+
+# ---------- ADAPTIVE SELECTION ----------
+# Per-player answer history shared by every session. New quizzes favour
+# questions the player got wrong and questions due for review, then ones
+# they have not seen yet (see adaptive.py).
+@st.cache_resource
+def get_selector():
+    note_miss()
+    return AdaptiveSelector()
+
+selector = cached_call(metrics, "selector", get_selector)
 
 # ---------- GOOGLE SHEETS ----------
+# Seconds before a Sheets request gives up; without it a hung request would
+# hold the score journal's syncer (or an I/O pool thread) forever
+SHEETS_TIMEOUT = 20
+
+def connect_google_sheet():
+    scope = ["https://spreadsheets.google.com/feeds", 
+             "https://www.googleapis.com/auth/drive"]
+    
+    creds_dict = dict(st.secrets["gcp_service_account"])
+    creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
+    client = gspread.authorize(creds)
+    client.set_timeout(SHEETS_TIMEOUT)
+    
+    return client.open("SainsQuiz Leaderboard").sheet1
+
+# Sheets written before the Subject and Total columns existed only get the
+# new header cells; existing scores are never cleared
+def ensure_header(sheet):
+    headers = sheet.row_values(1)
+    if headers == HEADER:
+        return
+    if not headers:
+        sheet.append_row(HEADER)
+    elif headers == HEADER[:len(headers)]:
+        sheet.update(range_name="A1", values=[HEADER])
+
+# Caching the ManagedSheet is safe: it connects on first use, retries and
+# reconnects by itself (see sheets_client.py), so a failed connection is
+# never what gets cached. The header check runs once per process.
 @st.cache_resource
 def get_google_sheets_connection():
+    note_miss()
     try:
         if "gcp_service_account" not in st.secrets:
             return None
-            
-        scope = ["https://spreadsheets.google.com/feeds", 
-                 "https://www.googleapis.com/auth/drive"]
-        
-        creds_dict = dict(st.secrets["gcp_service_account"])
-        creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
-        client = gspread.authorize(creds)
-        
-        sheet = client.open("SainsQuiz Leaderboard").sheet1
-        
-        headers = sheet.row_values(1)
-        if headers != ['Name', 'Score', 'Date']:
-            sheet.clear()
-            sheet.append_row(['Name', 'Score', 'Date'])
-        
-        return sheet
     except:
         return None
+    sheet = ManagedSheet(connect_google_sheet, prepare=ensure_header)
+    sheet.start_probe()
+    return sheet
+
+# ---------- LEADERBOARD STORAGE ----------
+# Picked from the [leaderboard] section of secrets.toml, e.g.
+#   [leaderboard]
+#   backend = "sqlite"        # "sheets", "sqlite", "memory" or "fake_sheets"
+#   path = "leaderboard.db"
+#   latency = 0.5             # seconds per call, fake_sheets only
+#   refresh_after = 30        # seconds before the board is read again
+#   max_stale = 300           # seconds before the board is flagged as out of date
+# SAINSQUIZ_LEADERBOARD_BACKEND overrides it. Without any config the app
+# uses Google Sheets when credentials exist and leaderboard.db otherwise,
+# which every worker process on the host shares. "memory" is per process.
+def get_leaderboard_config():
+    try:
+        config = dict(st.secrets.get("leaderboard", {}))
+        has_sheets = "gcp_service_account" in st.secrets
+    except:
+        config, has_sheets = {}, False
+    backend = os.environ.get("SAINSQUIZ_LEADERBOARD_BACKEND") or config.get("backend")
+    config["backend"] = backend or ("sheets" if has_sheets else "sqlite")
+    return config
+
+# Errors propagate instead of returning None, so st.cache_resource does not
+# keep a failed backend and the next call tries again
+@st.cache_resource
+def get_leaderboard_backend():
+    note_miss()
+    config = get_leaderboard_config()
+    sheet = get_google_sheets_connection() if config["backend"] == "sheets" else None
+    backend = create_backend(config["backend"], sheet=sheet, path=config.get("path"),
+                             latency=config.get("latency", 0))
+    if backend is not None:
+        # append_new is the journal's verified append (its first batch and
+        # every retry). On Sheets it runs stored_keys and append_rows, which
+        # are counted too; on SQLite and memory it is a separate alias.
+        instrument_calls(metrics, backend, ["append_rows", "append_new", "stored_keys", "read_from", "scan"],
+                         backend.name)
+        sheet = getattr(backend, "sheet", None)
+        if isinstance(sheet, ManagedSheet):
+            metrics.add_collector(lambda: [
+                ("sainsquiz_sheets_circuit_closed", sheet.breaker.state == "closed", {}),
+                ("sainsquiz_sheets_connects", sheet.connects, {}),
+                ("sainsquiz_sheets_retries", sheet.retries, {}),
+                ("sainsquiz_sheets_breaker_trips", sheet.breaker.trips, {}),
+                ("sainsquiz_sheets_seconds_since_success", sheet.health()['seconds_since_success'], {}),
+            ])
+    return backend
+
+def get_storage_health():
+    try:
+        sheet = getattr(get_leaderboard_backend(), "sheet", None)
+    except Exception as e:
+        return {'state': "unavailable", 'last_error': f"{type(e).__name__}: {e}"}
+    return sheet.health() if isinstance(sheet, ManagedSheet) else None
+
+# verify is set when some of the rows may already be stored (see journal.py)
+def append_score_rows(rows, verify=False):
+    backend = get_leaderboard_backend()
+    if backend is None:
+        raise ConnectionError("Leaderboard storage is not available")
+    if verify:
+        backend.append_new(rows)
+    else:
+        backend.append_rows(rows)
+
+# Scores spilled by the write-behind queue of earlier versions move into the
+# journal once; renaming a file first makes sure only one process imports it.
+# Spill files are named pending_scores.jsonl.<pid>.<n>; one whose writer is
+# still running (an older worker mid rolling restart) is left to it.
+SCORE_SPILL = "pending_scores.jsonl"
+
+def import_spilled_scores(journal):
+    for path in glob.glob(glob.escape(SCORE_SPILL) + "*"):
+        parts = path[len(SCORE_SPILL):].split(".")
+        if parts != [""]:
+            if len(parts) != 3 or not (parts[1].isdigit() and parts[2].isdigit()):
+                continue
+            if owner_alive(SCORE_SPILL, int(parts[1])):
+                continue
+        claimed = f"{journal.prefix}.import-{os.getpid()}"
+        try:
+            os.rename(path, claimed)
+        except OSError:
+            continue
+        with open(claimed, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    row = pad_row(json.loads(line))
+                except ValueError:
+                    continue
+                journal.append(row[:-1] + [row[-1] or uuid.uuid4().hex])
+        os.remove(claimed)
+
+# Every save is written to a local journal first (see journal.py) and is
+# acknowledged once it is on disk, so saving never waits on Sheets and no
+# score is lost while Sheets is down. A background thread in each process
+# sends the journal to the leaderboard backend in batches.
+@st.cache_resource
+def get_score_journal():
+    journal = Journal("journal/scores", append_score_rows, name="score-sync")
+    import_spilled_scores(journal)
+    metrics.add_collector(lambda: [
+        ("sainsquiz_score_journal_" + key, value, {})
+        for key, value in journal.stats().items() if key != 'last_error'
+    ])
+    return journal
 
-def save_score_to_sheets(name, score):
+# Answer events go through their own write-behind queue into analytics.db
+# (see analytics.py), so checking an answer never waits on the write
+@st.cache_resource
+def get_analytics_queue():
+    store = AnswerStore("analytics.db")
+    queue = WriteBehindQueue(store.write_events, batch_size=500,
+                             spill_path="pending_answers.jsonl", name="analytics-writer")
+    metrics.add_collector(lambda: [
+        ("sainsquiz_analytics_queue_" + key, value, {})
+        for key, value in queue.stats().items() if key != 'pending_spill'
+    ])
+    return queue
+
+def record_answer(q, answer, is_correct):
     try:
-        sheet = get_google_sheets_connection()
-        if sheet:
-            today = datetime.now().strftime("%Y-%m-%d %H:%M")
-            sheet.append_row([name, score, today])
-            return True
+        get_analytics_queue().put(answer_event(q, answer, is_correct, player=st.session_state.player,
+                                               quiz=st.session_state.quiz.quiz_id))
     except:
         pass
-    return False
 
-@st.cache_data(ttl=30)
-def load_leaderboard_from_sheets():
+# subject is "" for mixed-subject quizzes, which only count on overall boards.
+# The key lets the journal's syncer recognise a row it already sent.
+def save_score(name, score, subject="", total=""):
+    today = datetime.now().strftime("%Y-%m-%d %H:%M")
+    try:
+        get_score_journal().append([name, score, today, subject, total, uuid.uuid4().hex])
+    except:
+        return False
     try:
-        sheet = get_google_sheets_connection()
-        if sheet:
-            records = sheet.get_all_records()
-            leaderboard = []
-            for r in records:
-                if 'Name' in r and 'Score' in r:
-                    try:
-                        score = int(r['Score'])
-                        name = str(r['Name']).strip()
-                        if name and score > 0:
-                            leaderboard.append((name, score))
-                    except:
-                        pass
-            leaderboard.sort(key=lambda x: x[1], reverse=True)
-            return leaderboard[:10]
+        get_leaderboard_engine().add_pending(name, score, today, subject)
     except:
         pass
-    return None
+    return True
+
+# Shared by every session so each refresh only reads rows appended since
+# the previous one
+@st.cache_resource
+def get_leaderboard_engine():
+    return IncrementalLeaderboard(size=10)
+
+# ---------- BACKGROUND I/O ----------
+# Leaderboard reads run on a small thread pool shared by every session (see
+# io_pool.py), so a slow Sheets response never holds up the page
+LEADERBOARD_WAIT = 0.2
+
+@st.cache_resource
+def get_io_pool():
+    pool = IOPool(max_workers=4, name="leaderboard-io")
+    metrics.add_collector(lambda: [
+        ("sainsquiz_io_" + key, value, {}) for key, value in pool.stats().items()
+    ])
+    return pool
+
+# The board is served stale-while-revalidate: every session reads the
+# engine's last top-N at once, and at most one sync per process runs in the
+# background (see Revalidator in io_pool.py). The bounds come from the
+# [leaderboard] config; how old the board is goes out as a metric.
+@st.cache_resource
+def get_leaderboard_revalidator():
+    config = get_leaderboard_config()
+    revalidator = Revalidator(get_io_pool(), "leaderboard",
+                              refresh_after=float(config.get("refresh_after", 30)),
+                              max_stale=float(config.get("max_stale", 300)))
+    metrics.add_collector(lambda: [
+        ("sainsquiz_leaderboard_staleness_seconds", revalidator.age, {}),
+        ("sainsquiz_leaderboard_max_staleness_seconds", revalidator.max_stale, {}),
+        ("sainsquiz_leaderboard_refreshes", revalidator.refreshes, {}),
+        ("sainsquiz_leaderboard_refreshes_coalesced", revalidator.coalesced, {}),
+        ("sainsquiz_leaderboard_refresh_failures", revalidator.failures, {}),
+    ])
+    return revalidator
+
+# Starts a sync when one is due: the SQLite data version moved (any worker
+# committed, see storage.py) or refresh_after seconds passed (Sheets cannot
+# tell). Returns the future of the running sync, or None.
+def start_leaderboard_sync():
+    with perf.phase("sheets_connection"):
+        try:
+            backend = cached_call(metrics, "leaderboard_backend", get_leaderboard_backend)
+            data_version = backend.data_version() if backend else None
+        except:
+            return None
+    if backend is None:
+        return None
+    return get_leaderboard_revalidator().poke(get_leaderboard_engine().refresh, backend,
+                                              version=data_version)
+
+# Reading the in-process top-N is cheap, so scores saved since the last sync
+# appear straight away. Only a process that has no board yet waits for the
+# sync, at most LEADERBOARD_WAIT; after that the last board is served as is
+# and a newer one shows up on a later rerun. Returns (version, entries) of
+# one view or None before the first sync.
+def load_leaderboard(subject=None, window="all"):
+    engine = get_leaderboard_engine()
+    with perf.phase("load_leaderboard"):
+        future = start_leaderboard_sync()
+        if engine.last_sync is None:
+            wait(future, LEADERBOARD_WAIT)
+    if engine.last_sync is None:
+        return None
+    return engine.snapshot(subject, window)
+
+LEADERBOARD_EMPTY_HTML = """
+<div class="leaderboard-empty">
+    🎯 Be the first champion!<br>
+    <small>Complete a quiz to claim your spot</small>
+</div>
+"""
+
+LEADERBOARD_LOADING_HTML = """
+<div class="leaderboard-empty">
+    ⏳ Loading the leaderboard...
+</div>
+"""
+
+LEADERBOARD_STALE_HTML = """
+<div class="leaderboard-stale">
+    Last updated {minutes} min ago
+</div>
+"""
+
+# Scores saved but not yet confirmed by the backend
+PENDING_HTML = '<span class="leaderboard-pending" title="Saving...">⏳</span>'
+
+# The whole board as one HTML fragment, rebuilt only when the engine version
+# changes; every session shares the cached string
+@st.cache_data(max_entries=32)
+def render_leaderboard_html(version, _entries):
+    if not _entries:
+        return LEADERBOARD_EMPTY_HTML
+    items = []
+    for i, (name, score, pending) in enumerate(_entries, 1):
+        if i == 1:
+            rank_emoji = "👑"
+            rank_class = "rank-1"
+        elif i == 2:
+            rank_emoji = "⭐"
+            rank_class = "rank-2"
+        elif i == 3:
+            rank_emoji = "🌟"
+            rank_class = "rank-3"
+        else:
+            rank_emoji = f"{i}"
+            rank_class = ""
+        
+        items.append(f"""
+<div class="leaderboard-item">
+    <span class="leaderboard-rank {rank_class}">{rank_emoji}</span>
+    <span class="leaderboard-name">{html.escape(name)}{PENDING_HTML if pending else ""}</span>
+    <span class="leaderboard-score">{score}</span>
+</div>""")
+    return "".join(items)
+
+# Reruns on its own every 30 seconds to pick up new scores, and answering a
+# question does not have to rebuild it
+LEADERBOARD_WINDOWS = {"Today": "day", "This week": "week", "All time": "all"}
+LEADERBOARD_SUBJECTS = {"All subjects": None, "Physics ⚡": "Physics",
+                        "Chemistry 🧪": "Chemistry", "Biology 🧬": "Biology"}
+
+@st.fragment(run_every=30)
+def leaderboard_panel():
+    window = st.radio("Leaderboard period", list(LEADERBOARD_WINDOWS), index=2, horizontal=True,
+                      key="leaderboard_window", label_visibility="collapsed")
+    board_subject = st.selectbox("Leaderboard subject", list(LEADERBOARD_SUBJECTS),
+                                 key="leaderboard_subject", label_visibility="collapsed")
+    snapshot = load_leaderboard(LEADERBOARD_SUBJECTS[board_subject], LEADERBOARD_WINDOWS[window])
+    if snapshot:
+        board_html = render_leaderboard_html(*snapshot)
+    elif get_io_pool().running("leaderboard"):
+        board_html = LEADERBOARD_LOADING_HTML
+    else:
+        board_html = LEADERBOARD_EMPTY_HTML
+    revalidator = get_leaderboard_revalidator()
+    if snapshot and revalidator.stale:
+        board_html += LEADERBOARD_STALE_HTML.format(minutes=int(revalidator.age // 60))
+    st.markdown(board_html, unsafe_allow_html=True)
+
+# Started before anything is drawn, so the read overlaps with rendering the
+# page; the panel itself is filled in last (see the end of the script)
+start_leaderboard_sync()
+
+# ---------- MOCK EXAM ----------
+# SPM-style timed paper. All questions sit in one st.form, so choosing
+# answers sends nothing to the server; the only rerun is the hand-in, which
+# grades the whole paper by option index against the answer key in one
+# vectorized pass (QuizState.submit) and queues every answer for analytics
+# as one batch. The countdown in the browser is display only (the component
+# iframe does not reach into the page); the deadline that counts is the one
+# on the server, and a paper handed in more than EXAM_GRACE seconds after it
+# is marked late.
+EXAM_LENGTHS = [40, 50, 60]
+EXAM_SECONDS_PER_QUESTION = 90
+EXAM_GRACE = 30
+
+EXAM_TIMER_HTML = """
+<div id="exam-timer" style="font: 600 1.1rem Inter, sans-serif; color: #1e293b; text-align: center;"></div>
+<script>
+const end = Date.now() + __REMAINING_MS__;
+const timer = document.getElementById("exam-timer");
+const handle = setInterval(tick, 1000);
+function tick() {
+    const left = Math.max(0, end - Date.now());
+    const minutes = Math.floor(left / 60000), seconds = Math.floor(left / 1000) % 60;
+    timer.textContent = left ? "⏱️ " + minutes + ":" + String(seconds).padStart(2, "0") + " left"
+                             : "⏱️ Time is up, hand in your paper now";
+    if (!left) {
+        timer.style.color = "#dc2626";
+        clearInterval(handle);
+    }
+}
+tick();
+</script>
+"""
+
+def submit_exam():
+    quiz = st.session_state.quiz
+    if quiz is None or quiz.finished:
+        return
+    exam_bank = bank_reloader.get(quiz.bank_version)
+    if exam_bank is None:
+        return
+    questions = [exam_bank[qid] for qid in quiz.ids]
+    chosen = [st.session_state.get(f"exam_{i}") for i in range(quiz.total)]
+    chosen = [UNANSWERED if option is None else option for option in chosen]
+    right = quiz.submit(chosen, [q.correct_option for q in questions],
+                        late=quiz.remaining() < -EXAM_GRACE)
+    snapshot_quiz()
+    
+    player = st.session_state.player
+    selector.record_many(player, quiz.bank_version, questions, right)
+    try:
+        get_analytics_queue().put_many([
+            answer_event(q, q.options[option] if option != UNANSWERED else None, ok,
+                         player=player, quiz=quiz.quiz_id)
+            for q, option, ok in zip(questions, chosen, right)
+        ])
+    except:
+        pass
+
+def exam_form():
+    remaining = quiz.remaining()
+    components.html(EXAM_TIMER_HTML.replace("__REMAINING_MS__", str(max(int(remaining * 1000), 0))),
+                    height=40)
+    if remaining < -EXAM_GRACE:
+        st.warning("⏰ Time is up. Hand in your paper now; it will be marked late.")
+    
+    with st.form(f"exam_{quiz.quiz_id}"):
+        for i, qid in enumerate(quiz.ids):
+            q = quiz_bank[qid]
+            st.markdown(f"""
+            <div class="question-box">
+                <div class="question-header">
+                    <span class="question-number">📝 Question {i + 1}</span>
+                    <span class="question-progress">{i + 1}/{quiz.total}</span>
+                </div>
+                <div class="question-text">
+                    {q.question}
+                </div>
+                <span class="subject-tag">{q.subject}</span>
+            </div>
+            """, unsafe_allow_html=True)
+            st.radio(f"Question {i + 1}", range(len(q.options)), format_func=q.options.__getitem__,
+                     key=f"exam_{i}", index=None, label_visibility="collapsed")
+        st.form_submit_button("📤 Hand In Paper", use_container_width=True, type="primary",
+                              on_click=submit_exam)
 
 # ---------- SIDEBAR ----------
-# ---------- SIDEBAR ----------
-with st.sidebar:
+# A timed exam (seconds_each > 0) must get all `count` questions, and gets a
+# deadline on the server clock for the questions it has
+def start_quiz(count, seconds_each=0):
+    subject = None if st.session_state.subject == "All" else st.session_state.subject
+    question_ids = selector.select(st.session_state.player, bank_version, question_bank, count,
+                                   subject=subject, difficulty=st.session_state.difficulty)
+    # Subject and difficulty together can match nothing
+    if not question_ids:
+        st.warning("No questions match this subject and difficulty. Please pick another combination.")
+        return
+    if seconds_each and len(question_ids) < count:
+        st.warning(f"Only {len(question_ids)} questions match this subject and difficulty, "
+                   f"not enough for a {count}-question mock exam.")
+        return
+    
+    end_quiz()
+    st.session_state.feedback = None
+    st.session_state.quiz = QuizState(uuid.uuid4().hex, bank_version, st.session_state.player,
+                                      question_ids, subject or "",
+                                      deadline=time.time() + len(question_ids) * seconds_each
+                                      if seconds_each else 0)
+    snapshot_quiz()
+    st.rerun()
+
+with st.sidebar, perf.phase("sidebar"):
     st.markdown(f"""
     <div class="sidebar-header">
         <h2>{LOGO_ICON} SainsQuiz</h2>
@@ -578,43 +767,39 @@ with st.sidebar:
     
     if selected != st.session_state.subject:
         st.session_state.subject = selected
-        st.session_state.quiz_started = False
+        end_quiz()
         st.rerun()
     
-    # New quiz button with icon
-    if st.button("🎯 New Quiz", use_container_width=True):
-        st.session_state.quiz_started = True
-        st.session_state.q_index = 0
-        st.session_state.score = 0
-        st.session_state.answers = []
-        st.session_state.feedback = None
-        st.session_state.answer_submitted = False
-        st.session_state.current_answer = None
-        
-        if st.session_state.subject == "All":
-            st.session_state.questions = random.sample(questions_db, min(10, len(questions_db)))
-        else:
-            filtered = [q for q in questions_db if q['subject'] == st.session_state.subject]
-            st.session_state.questions = random.sample(filtered, min(10, len(filtered)))
+    # Difficulty filter, only shown when the bank has difficulty levels
+    levels = question_bank.values('difficulty')
+    if levels:
+        level_options = ["Any"] + levels
+        current_level = st.session_state.difficulty if st.session_state.difficulty in levels else "Any"
+        selected_level = st.selectbox("🎚️ Difficulty", level_options,
+                                      index=level_options.index(current_level))
+        selected_level = None if selected_level == "Any" else selected_level
         
-        st.session_state.total_questions = len(st.session_state.questions)
-        st.rerun()
+        if selected_level != st.session_state.difficulty:
+            st.session_state.difficulty = selected_level
+            end_quiz()
+            st.rerun()
     
-    # Current progress in sidebar (if quiz started)
-    if st.session_state.quiz_started and st.session_state.total_questions > 0:
-        st.markdown("---")
-        st.markdown("### 📊 Your Progress")
-        
-        # Metric
-        st.metric("Current Score", 
-                 f"{st.session_state.score}/{st.session_state.total_questions}")
-        
-        # Progress with emoji
-        progress = st.session_state.q_index / st.session_state.total_questions
-        st.progress(progress)
-        
-        questions_left = st.session_state.total_questions - st.session_state.q_index
-        st.caption(f"🎯 {questions_left} questions remaining")
+    # New quiz button with icon
+    if st.button("🎯 New Quiz", use_container_width=True):
+        start_quiz(10)
+    
+    # Timed mock exam: every question on one form, graded when it is handed in.
+    # Only lengths the current subject and difficulty can fill are offered.
+    available = question_bank.count(None if st.session_state.subject == "All" else st.session_state.subject,
+                                     difficulty=st.session_state.difficulty)
+    exam_lengths = [n for n in EXAM_LENGTHS if n <= available]
+    if exam_lengths:
+        exam_length = st.selectbox("📝 Mock exam", exam_lengths, format_func=lambda n: f"{n} questions")
+        if st.button("⏱️ Start Mock Exam", use_container_width=True):
+            start_quiz(exam_length, seconds_each=EXAM_SECONDS_PER_QUESTION)
+    else:
+        st.caption(f"📝 Mock exams need at least {EXAM_LENGTHS[0]} questions; "
+                   f"{available} match this subject and difficulty.")
     
     # Leaderboard with motivational design
     st.markdown("---")
@@ -624,37 +809,7 @@ with st.sidebar:
     </div>
     """, unsafe_allow_html=True)
     
-    leaderboard = load_leaderboard_from_sheets()
-    
-    if leaderboard:
-        for i, (name, score) in enumerate(leaderboard, 1):
-            if i == 1:
-                rank_emoji = "👑"
-                rank_class = "rank-1"
-            elif i == 2:
-                rank_emoji = "⭐"
-                rank_class = "rank-2"
-            elif i == 3:
-                rank_emoji = "🌟"
-                rank_class = "rank-3"
-            else:
-                rank_emoji = f"{i}"
-                rank_class = ""
-            
-            st.markdown(f"""
-            <div class="leaderboard-item">
-                <span class="leaderboard-rank {rank_class}">{rank_emoji}</span>
-                <span class="leaderboard-name">{name}</span>
-                <span class="leaderboard-score">{score}</span>
-            </div>
-            """, unsafe_allow_html=True)
-    else:
-        st.markdown("""
-        <div class="leaderboard-empty">
-            🎯 Be the first champion!<br>
-            <small>Complete a quiz to claim your spot</small>
-        </div>
-        """, unsafe_allow_html=True)
+    leaderboard_slot = st.container()
     
     # Motivational quote
     st.markdown("---")
@@ -667,7 +822,110 @@ with st.sidebar:
     ]
     st.caption(random.choice(quotes))
 
+# ---------- QUESTION FLOW ----------
+# Checking an answer and moving to the next question only rerun the
+# question_flow fragment; the CSS, sidebar, leaderboard and header are left
+# alone. The buttons update state in on_click callbacks, which run before the
+# fragment reruns, so no explicit st.rerun() is needed. Progress is shown in
+# the fragment because a fragment rerun cannot update the sidebar.
+def check_answer(q):
+    quiz = st.session_state.quiz
+    answer = st.session_state.get(f"q_{quiz.index}")
+    if answer is None:
+        st.session_state.answer_missing = True
+        return
+    is_correct = (answer == q.correct_answer)
+    
+    # Only the chosen option's index is kept; the text comes from the bank
+    quiz.answer(q.options.index(answer), is_correct)
+    selector.record(st.session_state.player, quiz.bank_version, q, is_correct)
+    record_answer(q, answer, is_correct)
+    snapshot_quiz()
+
+def next_question():
+    st.session_state.quiz.advance()
+    snapshot_quiz()
+
+@st.fragment
+def question_flow():
+    quiz = st.session_state.quiz
+    # The results screen lives outside the fragment
+    if quiz.finished:
+        st.rerun()
+    
+    fragment_perf = RerunTimer(metrics)
+    
+    questions_left = quiz.total - quiz.index
+    st.progress(quiz.index / quiz.total,
+                text=f"📊 Score {quiz.score}/{quiz.total} • "
+                     f"🎯 {questions_left} questions remaining")
+    
+    q = quiz_bank[quiz.current]
+    
+    # Question header with clear progress
+    st.markdown(f"""
+    <div class="question-box">
+        <div class="question-header">
+            <span class="question-number">📝 Question {quiz.index + 1}</span>
+            <span class="question-progress">{quiz.index + 1}/{quiz.total}</span>
+        </div>
+        <div class="question-text">
+            {q.question}
+        </div>
+        <span class="subject-tag">{q.subject}</span>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    # Options; a resumed quiz has no widget state, so a checked answer is
+    # shown from the quiz state
+    st.radio("", q.options, key=f"q_{quiz.index}", 
+             index=quiz.chosen[quiz.index] if quiz.submitted else None, label_visibility="collapsed",
+             disabled=quiz.submitted)
+    
+    # Button container
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        button_label = "✅ Check Answer" if not quiz.submitted else "✅ Answer Submitted"
+        st.button(button_label, use_container_width=True, disabled=quiz.submitted,
+                  on_click=check_answer, args=(q,))
+        if st.session_state.pop('answer_missing', False):
+            st.warning("🎯 Please select an answer first!")
+    
+    with col2:
+        if quiz.submitted:
+            st.button("➡️ Next Question", use_container_width=True, type="primary",
+                      on_click=next_question)
+    
+    # Feedback
+    if quiz.submitted:
+        if quiz.is_correct(quiz.index):
+            st.markdown(f"""
+            <div class="feedback-correct">
+                <div style="font-size: 1.5rem; margin-bottom: 0.5rem;">🎉 Correct!</div>
+                <div>{q.explanation}</div>
+            </div>
+            """, unsafe_allow_html=True)
+        else:
+            st.markdown(f"""
+            <div class="feedback-wrong">
+                <div style="font-size: 1.5rem; margin-bottom: 0.5rem;">📚 Keep Learning!</div>
+                <div><strong>Correct answer:</strong> {q.correct_answer}</div>
+                <div style="margin-top: 0.5rem;">{q.explanation}</div>
+            </div>
+            """, unsafe_allow_html=True)
+    
+    fragment_perf.lap("question_fragment")
+
 # ---------- MAIN CONTENT ----------
+perf.mark()
+if quiz is None:
+    main_phase = "welcome"
+elif not quiz.finished:
+    main_phase = "question"
+else:
+    main_phase = "results"
+
 st.markdown("""
 <div class="header">
     <h1>🎓 SainsQuiz</h1>
@@ -675,7 +933,7 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
-if not st.session_state.quiz_started:
+if quiz is None:
     # Welcome message
     st.markdown("### 🌟 Ready to test your knowledge?")
     
@@ -722,87 +980,17 @@ if not st.session_state.quiz_started:
         """, unsafe_allow_html=True)
 
 else:
-    if st.session_state.q_index < st.session_state.total_questions:
-        q = st.session_state.questions[st.session_state.q_index]
-        
-        # Question header with clear progress
-        st.markdown(f"""
-        <div class="question-box">
-            <div class="question-header">
-                <span class="question-number">📝 Question {st.session_state.q_index + 1}</span>
-                <span class="question-progress">{st.session_state.q_index + 1}/{st.session_state.total_questions}</span>
-            </div>
-            <div class="question-text">
-                {q['question']}
-            </div>
-            <span class="subject-tag">{q['subject']}</span>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        # Options
-        answer = st.radio("", q['options'], key=f"q_{st.session_state.q_index}", 
-                         index=None, label_visibility="collapsed",
-                         disabled=st.session_state.answer_submitted)
-        
-        # Button container
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            button_label = "✅ Check Answer" if not st.session_state.answer_submitted else "✅ Answer Submitted"
-            if st.button(button_label, use_container_width=True, disabled=st.session_state.answer_submitted):
-                if answer is None:
-                    st.warning("🎯 Please select an answer first!")
-                else:
-                    correct = q['options'][q['correct_option']]
-                    is_correct = (answer == correct)
-                    
-                    st.session_state.answers.append({
-                        'question': q['question'],
-                        'user_answer': answer,
-                        'correct': is_correct,
-                        'correct_answer': correct,
-                        'explanation': q['explanation']
-                    })
-                    
-                    if is_correct:
-                        st.session_state.score += 1
-                    
-                    st.session_state.answer_submitted = True
-                    st.session_state.current_answer = answer
-                    st.rerun()
-        
-        with col2:
-            if st.session_state.answer_submitted:
-                if st.button("➡️ Next Question", use_container_width=True, type="primary"):
-                    st.session_state.q_index += 1
-                    st.session_state.answer_submitted = False
-                    st.session_state.current_answer = None
-                    st.rerun()
-        
-        # Feedback
-        if st.session_state.answer_submitted and st.session_state.answers:
-            last = st.session_state.answers[-1]
-            if last['correct']:
-                st.markdown(f"""
-                <div class="feedback-correct">
-                    <div style="font-size: 1.5rem; margin-bottom: 0.5rem;">🎉 Correct!</div>
-                    <div>{last['explanation']}</div>
-                </div>
-                """, unsafe_allow_html=True)
-            else:
-                st.markdown(f"""
-                <div class="feedback-wrong">
-                    <div style="font-size: 1.5rem; margin-bottom: 0.5rem;">📚 Keep Learning!</div>
-                    <div><strong>Correct answer:</strong> {last['correct_answer']}</div>
-                    <div style="margin-top: 0.5rem;">{last['explanation']}</div>
-                </div>
-                """, unsafe_allow_html=True)
+    if not quiz.finished:
+        if quiz.timed:
+            exam_form()
+        else:
+            question_flow()
     
     else:
         # Quiz complete - Celebratory screen
         st.balloons()
         
-        percentage = (st.session_state.score / st.session_state.total_questions) * 100
+        percentage = (quiz.score / quiz.total) * 100 if quiz.total else 0
         
         # Motivational message based on score
         if percentage >= 80:
@@ -818,63 +1006,80 @@ else:
         st.markdown(f"""
         <div class="score-card">
             <div style="font-size: 1.5rem;">{emoji} {msg}</div>
-            <div class="score-number">{st.session_state.score}/{st.session_state.total_questions}</div>
+            <div class="score-number">{quiz.score}/{quiz.total}</div>
             <div class="score-percentage">{percentage:.1f}%</div>
         </div>
         """, unsafe_allow_html=True)
         
         # Review answers
         with st.expander("📋 Review Your Answers"):
-            for i, ans in enumerate(st.session_state.answers):
-                if ans['correct']:
+            for i, qid, chosen, correct in quiz.answers():
+                ans_q = quiz_bank[qid]
+                if correct:
                     st.markdown(f"""
                     <div class="review-item review-correct">
-                        <strong>✅ Question {i+1}:</strong> {ans['question']}<br>
-                        <small>✨ {ans['explanation']}</small>
+                        <strong>✅ Question {i+1}:</strong> {ans_q.question}<br>
+                        <small>✨ {ans_q.explanation}</small>
                     </div>
                     """, unsafe_allow_html=True)
                 else:
                     st.markdown(f"""
                     <div class="review-item review-wrong">
-                        <strong>📚 Question {i+1}:</strong> {ans['question']}<br>
-                        <strong>Correct answer:</strong> {ans['correct_answer']}<br>
-                        <small>💡 {ans['explanation']}</small>
+                        <strong>📚 Question {i+1}:</strong> {ans_q.question}<br>
+                        <strong>Correct answer:</strong> {ans_q.correct_answer}<br>
+                        <small>💡 {ans_q.explanation}</small>
                     </div>
                     """, unsafe_allow_html=True)
         
-        # Save score with motivation
-        st.markdown("### 🏆 Save Your Achievement")
-        col1, col2 = st.columns([3, 1])
+        # Save score with motivation. Mock exams have 40-60 questions, so they
+        # stay off the leaderboard of 10-question quizzes.
+        if quiz.late:
+            st.warning("⏰ This paper was handed in after the time was up.")
+        if quiz.timed:
+            st.info("📝 Your mock exam answers are recorded for your teacher's report. "
+                    "The leaderboard ranks 10-question quizzes only.")
+        else:
+            st.markdown("### 🏆 Save Your Achievement")
+            col1, col2 = st.columns([3, 1])
         
-        with col1:
-            name = st.text_input("", placeholder="Enter your name to join the leaderboard", 
-                                label_visibility="collapsed")
+            with col1:
+                name = st.text_input("", placeholder="Enter your name to join the leaderboard", 
+                                    label_visibility="collapsed")
         
-        with col2:
-            if st.button("💾 Save Score", use_container_width=True):
-                if name:
-                    if save_score_to_sheets(name, st.session_state.score):
-                        st.success("✨ Congratulations! You're on the leaderboard!")
-                        st.balloons()
-                        st.cache_data.clear()
+            with col2:
+                if st.button("💾 Save Score", use_container_width=True):
+                    if name:
+                        with perf.phase("save"):
+                            saved = save_score(name, quiz.score, quiz.subject, quiz.total)
+                        if saved:
+                            # From now on this player's history follows their name
+                            selector.rename(st.session_state.player, name.strip())
+                            st.session_state.player = name.strip()
+                            # A resumed copy must not save the same score again
+                            forget_snapshot(quiz)
+                            st.success("✨ Congratulations! You're on the leaderboard!")
+                            st.balloons()
+                            st.rerun()
+                        else:
+                            st.warning("Your score could not be saved right now. Please try again in a moment.")
                     else:
-                        st.session_state.leaderboard.append((name, st.session_state.score))
-                        st.session_state.leaderboard.sort(key=lambda x: x[1], reverse=True)
-                        st.session_state.leaderboard = st.session_state.leaderboard[:10]
-                        st.success("✨ Saved successfully!")
-                    st.rerun()
-                else:
-                    st.warning("Please enter your name to save your score!")
+                        st.warning("Please enter your name to save your score!")
         
         # Play again
         st.markdown("---")
         col1, col2, col3 = st.columns([1, 2, 1])
         with col2:
             if st.button("🔄 Take Another Quiz", use_container_width=True):
-                st.session_state.quiz_started = False
-                st.session_state.answer_submitted = False
+                end_quiz()
                 st.rerun()
 
+# The leaderboard is timed as its own phases, so it is not counted here
+perf.lap(main_phase)
+
+# ---------- LEADERBOARD ----------
+with leaderboard_slot:
+    leaderboard_panel()
+
 # ---------- FOOTER ----------
 st.markdown("""
 <div class="footer">
@@ -883,4 +1088,43 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
+# ---------- DEBUG PANEL ----------
+if get_metrics_config().get("debug_panel") or st.query_params.get("debug") == "1":
+    with st.expander("🛠️ Debug: this rerun"):
+        st.caption(f"Rerun so far: {(perf.elapsed()) * 1000:.1f} ms")
+        st.dataframe(pd.DataFrame(
+            [(phase, seconds * 1000) for phase, seconds in perf.phases],
+            columns=["phase", "ms"]), hide_index=True, use_container_width=True)
+        
+        cache = pd.DataFrame([(labels['cache'], labels['result'], value) for labels, value
+                              in metrics.samples("sainsquiz_cache_requests_total")],
+                             columns=["cache", "result", "count"])
+        if not cache.empty:
+            st.markdown("**Cache hits / misses (process)**")
+            st.dataframe(cache.pivot_table(index="cache", columns="result", values="count",
+                                           fill_value=0), use_container_width=True)
+        
+        calls = pd.DataFrame([(labels['target'], labels['op'], labels['status'], value) for labels, value
+                              in metrics.samples("sainsquiz_external_calls_total")],
+                             columns=["backend", "call", "status", "count"])
+        if not calls.empty:
+            st.markdown("**External calls (process)**")
+            st.dataframe(calls, hide_index=True, use_container_width=True)
+        
+        st.markdown("**Score journal**")
+        st.json(get_score_journal().stats())
+        st.markdown("**Leaderboard cache**")
+        st.json(get_leaderboard_revalidator().stats())
+        st.caption(f"Question bank version {bank_version}, {bank_reloader.reloads} reload(s)")
+        if bank_reloader.last_error is not None:
+            st.error(f"Last question bank reload failed, still serving version {bank_version}:\n\n"
+                     f"{bank_reloader.last_error}")
+        health = get_storage_health()
+        if health:
+            st.markdown("**Google Sheets connection**")
+            st.json(health)
+        st.code(metrics.render(), language="text")
+
+perf.finish()
+
 
@@ -0,0 +1,122 @@
+import argparse
+import glob
+import hashlib
+import os
+import re
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+STYLE_SOURCE = os.path.join(ROOT, "assets", "style.css")
+STATIC_DIR = os.path.join(ROOT, "static")
+# Streamlit serves ./static at this URL when server.enableStaticServing is on
+STATIC_URL = "app/static"
+GOOGLE_FONTS = "https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700&display=swap"
+
+
+# ---------- MINIFY ----------
+# Enough for our hand-written stylesheet: drops comments and whitespace
+# around punctuation. Spaces before ':' are kept (`div :hover` differs from
+# `div:hover`), as are spaces around '+' and '-' (calc()).
+def minify_css(text):
+    text = re.sub(r"/\*.*?\*/", "", text, flags=re.S)
+    text = re.sub(r"\s+", " ", text)
+    text = re.sub(r"\s*([{};,>])\s*", r"\1", text)
+    text = re.sub(r":\s+", ":", text)
+    text = text.replace(";}", "}")
+    return text.strip()
+
+
+# ---------- FONTS ----------
+# Drop Inter woff2 files into static/fonts to serve the font locally (and
+# work offline): either one variable font (Inter.woff2, InterVariable.woff2)
+# or one file per weight (Inter-400.woff2, Inter-600.woff2, ...). Without
+# them the stylesheet imports Inter from Google Fonts.
+def font_rules(static_dir=STATIC_DIR):
+    fonts_dir = os.path.join(static_dir, "fonts")
+    rules = []
+    for name in ("InterVariable.woff2", "Inter.woff2"):
+        if os.path.exists(os.path.join(fonts_dir, name)):
+            rules.append(_font_face(name, "100 900"))
+            break
+    else:
+        for path in sorted(glob.glob(os.path.join(fonts_dir, "Inter-*.woff2"))):
+            weight = os.path.basename(path)[len("Inter-"):-len(".woff2")]
+            if weight.isdigit():
+                rules.append(_font_face(os.path.basename(path), weight))
+    if not rules:
+        return f"@import url('{GOOGLE_FONTS}');"
+    return "".join(rules)
+
+
+def _font_face(filename, weight):
+    # Relative to the stylesheet, which is served from the same static folder
+    return ("@font-face{font-family:'Inter';font-style:normal;font-display:swap;"
+            f"font-weight:{weight};src:url('fonts/{filename}') format('woff2')}}")
+
+
+# ---------- STATIC SERVING ----------
+# Whether this Streamlit's /app/static route sends .css files as text/css.
+# Up to 1.55 it sends everything outside a short list of image, font and
+# document types as text/plain with X-Content-Type-Options: nosniff, and
+# browsers refuse to apply such a stylesheet. From 1.56 every file gets its
+# real type (the list is gone).
+def static_css_supported():
+    try:
+        from streamlit.web.server import app_static_file_handler
+    except ImportError:
+        return True
+    safe = getattr(app_static_file_handler, "SAFE_APP_STATIC_FILE_EXTENSIONS", None)
+    return safe is None or ".css" in safe
+
+
+# ---------- BUILD ----------
+# Writes static/style.<hash>.css and returns (url, css); url is None when
+# the file cannot be written. css is the same stylesheet for inlining, with
+# font URLs made relative to the page. The hash covers the final CSS, so a
+# changed stylesheet or font set gets a new URL; browsers revalidate it
+# (ETag / Last-Modified) rather than download it again. Older builds are
+# removed.
+def build_stylesheet(source=STYLE_SOURCE, static_dir=STATIC_DIR):
+    with open(source, "r", encoding="utf-8") as f:
+        css = font_rules(static_dir) + minify_css(f.read())
+    digest = hashlib.sha256(css.encode("utf-8")).hexdigest()[:12]
+    filename = f"style.{digest}.css"
+    path = os.path.join(static_dir, filename)
+    inline_css = css.replace("url('fonts/", f"url('{STATIC_URL}/fonts/")
+
+    try:
+        os.makedirs(static_dir, exist_ok=True)
+        if not os.path.exists(path):
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(css)
+            os.replace(tmp_path, path)
+    except OSError:
+        # Read-only checkout: the caller inlines the CSS instead
+        return None, inline_css
+    for old in glob.glob(os.path.join(static_dir, "style.*.css")):
+        if os.path.basename(old) != filename:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+    return f"{STATIC_URL}/{filename}", inline_css
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the minified, content-hashed stylesheet.")
+    parser.add_argument("source", nargs="?", default=STYLE_SOURCE)
+    parser.add_argument("-o", "--static-dir", default=STATIC_DIR)
+    args = parser.parse_args(argv)
+    with open(args.source, "r", encoding="utf-8") as f:
+        original = len(f.read().encode("utf-8"))
+    url, css = build_stylesheet(args.source, args.static_dir)
+    if url is None:
+        print(f"cannot write to {args.static_dir}", file=sys.stderr)
+        return 1
+    print(f"{url}: {len(css.encode('utf-8'))} bytes (source {original} bytes)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
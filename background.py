@@ -0,0 +1,101 @@
+import glob
+import os
+import re
+import weakref
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+_writers = weakref.WeakSet()
+
+
+# ---------- BACKGROUND WRITERS ----------
+# Journals and write-behind queues register here, so callers that exit
+# without running atexit hooks (multiprocessing workers) can wait for all
+# of them to hand off what they hold
+def register(writer):
+    _writers.add(writer)
+
+
+def flush_all(timeout=None):
+    return all([w.flush(timeout) for w in list(_writers)])
+
+
+# ---------- OWNER LOCKS ----------
+# Files that one process writes are named after its pid. For as long as it
+# lives the process holds an exclusive lock on <base>.<pid>.lock, which the
+# OS drops when it exits, however it exits (crash, kill -9). Before taking
+# over another process's files, ask alive(pid): the answer depends only on
+# whether the owner is still running, not on how recently it wrote, so a
+# process stuck in a slow call is never mistaken for a dead one. A pid that
+# an unrelated process reuses holds no lock and does not count as alive.
+class OwnerLock:
+    def __init__(self, base):
+        self.base = base
+        self.path = self.lock_path(os.getpid())
+        while True:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            _lock(fd, block=True)
+            # alive() may have removed a dead namesake's file just before
+            # we locked it; then lock the file that is there now
+            try:
+                if os.path.samestat(os.fstat(fd), os.stat(self.path)):
+                    break
+            except FileNotFoundError:
+                pass
+            os.close(fd)
+        self._fd = fd
+
+    def lock_path(self, pid):
+        return f"{self.base}.{pid}.lock"
+
+    def alive(self, pid):
+        return pid == os.getpid() or owner_alive(self.base, pid)
+
+    # Removes the lock files of processes that are gone
+    def prune(self):
+        pattern = re.compile(re.escape(self.base) + r"\.(\d+)\.lock")
+        for path in glob.glob(glob.escape(self.base) + ".*.lock"):
+            match = pattern.fullmatch(path)
+            if match:
+                self.alive(int(match.group(1)))
+
+
+# Whether process pid still holds its lock under base, for callers that
+# take over files without writing any of their own
+def owner_alive(base, pid):
+    path = f"{base}.{pid}.lock"
+    try:
+        fd = os.open(path, os.O_RDWR)
+    except FileNotFoundError:
+        return False
+    try:
+        if not _lock(fd, block=False):
+            return True
+        # Removed while locked, so a later process with this pid starts on a
+        # file of its own
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return False
+    finally:
+        os.close(fd)
+
+
+def _lock(fd, block):
+    if fcntl is not None:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | (0 if block else fcntl.LOCK_NB))
+            return True
+        except BlockingIOError:
+            return False
+    try:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_LOCK if block else msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
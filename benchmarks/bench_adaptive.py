@@ -0,0 +1,68 @@
+"""Time adaptive quiz selection against a large synthetic bank and many players.
+
+Every player first answers `--history` quizzes (70% right) with the clock
+advancing between quizzes, then selection of one k-question quiz is timed
+for random players, with and without a subject filter.
+
+    python benchmarks/bench_adaptive.py --questions 200000 --players 2000 --history 20
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from adaptive import AdaptiveSelector  # noqa: E402
+from question_bank import QuestionBank  # noqa: E402
+
+SUBJECTS = ["Physics ⚡", "Chemistry 🧪", "Biology 🧬"]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--questions", type=int, default=100000)
+    parser.add_argument("--players", type=int, default=1000)
+    parser.add_argument("--history", type=int, default=20, help="quizzes answered per player beforehand")
+    parser.add_argument("--k", type=int, default=10, help="questions per quiz")
+    parser.add_argument("--selections", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+    random.seed(args.seed)
+
+    bank = QuestionBank([{'subject': random.choice(SUBJECTS), 'question': f"Question {i}",
+                          'options': ["A", "B", "C", "D"], 'correct_option': 0,
+                          'difficulty': random.choice(["easy", "medium", "hard"])}
+                         for i in range(args.questions)])
+    now = [time.time()]
+    selector = AdaptiveSelector(max_players=args.players, clock=lambda: now[0])
+
+    started = time.perf_counter()
+    for _ in range(args.history):
+        for player in range(args.players):
+            for qid in selector.select(player, 1, bank, args.k):
+                selector.record(player, 1, bank[qid], random.random() < 0.7)
+        now[0] += 6 * 3600
+    print(f"history: {args.players} players x {args.history} quizzes in "
+          f"{time.perf_counter() - started:.1f} s")
+
+    for label, subject in (("all subjects", None), ("one subject", SUBJECTS[0])):
+        timings = []
+        for _ in range(args.selections):
+            player = random.randrange(args.players)
+            t0 = time.perf_counter()
+            selector.select(player, 1, bank, args.k, subject=subject)
+            timings.append(time.perf_counter() - t0)
+        print(f"{label:<14} mean {sum(timings) / len(timings) * 1e6:7.1f} us   "
+              f"p50 {percentile(timings, 50) * 1e6:7.1f} us   p99 {percentile(timings, 99) * 1e6:7.1f} us")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
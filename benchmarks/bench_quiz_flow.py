@@ -0,0 +1,322 @@
+"""Drive the real app headlessly through full quizzes and report rerun latency.
+
+Each simulated student is a Streamlit AppTest session. A student picks a
+subject, starts a quiz, answers every question (Check Answer + Next
+Question), then saves the score. Leaderboard storage is a fake Google Sheet
+with configurable latency, or with --backend sqlite one SQLite file shared by
+every worker.
+
+AppTest swaps process-global state while a script runs, so the sessions of
+one worker process take turns one rerun at a time (they still share
+st.cache_resource, like sessions of one `streamlit run app.py`). Use
+--processes to run several workers in parallel, like several `streamlit run`
+workers on one host. --scaling runs the same per-worker load at each process
+count and reports the speedup; with sqlite it also checks that every saved
+score reached the shared leaderboard.
+
+    python benchmarks/bench_quiz_flow.py --sessions 8 --quizzes 3 --latency 0.2
+    python benchmarks/bench_quiz_flow.py --sessions 8 --processes 4
+    python benchmarks/bench_quiz_flow.py --backend sqlite --scaling 1,2,4
+    python benchmarks/bench_quiz_flow.py --save baseline.json
+    python benchmarks/bench_quiz_flow.py --compare baseline.json --tolerance 0.25
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import pickle
+import random
+import resource
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from streamlit.testing.v1 import AppTest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, "app.py")
+SUBJECTS = ["All", "Physics ⚡", "Chemistry 🧪", "Biology 🧬"]
+
+
+def leaderboard_secrets(args):
+    secrets = {"backend": args.backend, "latency": args.latency}
+    if args.db:
+        secrets["path"] = args.db
+    return secrets
+
+
+def click(at, label, where=None):
+    buttons = (where or at).button
+    for button in buttons:
+        if label in button.label:
+            return button.click()
+    raise RuntimeError(f"No button labelled {label!r}")
+
+
+class Student:
+    def __init__(self, args, name):
+        self.args = args
+        self.name = name
+        self.timings = {}
+        self.session_bytes = 0
+        self.at = AppTest.from_file(APP, default_timeout=args.timeout)
+        self.at.secrets["leaderboard"] = leaderboard_secrets(args)
+
+    def step(self, kind, action):
+        started = time.perf_counter()
+        action().run()
+        self.timings.setdefault(kind, []).append(time.perf_counter() - started)
+        if self.at.exception:
+            raise RuntimeError(f"{kind}: {self.at.exception[0].message}")
+
+    # A generator so the scheduler can interleave students one rerun at a time
+    def run(self, quizzes):
+        at = self.at
+        self.step("first load", lambda: at)
+        yield
+        for n in range(quizzes):
+            subject = random.choice(SUBJECTS)
+            self.step("choose subject", lambda: at.sidebar.selectbox[0].select(subject))
+            yield
+            self.step("new quiz", lambda: click(at, "New Quiz", at.sidebar))
+            yield
+            while at.main.radio:
+                radio = at.main.radio[0]
+                self.step("select option", lambda: radio.set_value(random.choice(radio.options)))
+                yield
+                self.step("check answer", lambda: click(at, "Check Answer"))
+                yield
+                self.step("next question", lambda: click(at, "Next Question"))
+                yield
+            self.step("enter name", lambda: at.text_input[0].input(f"{self.name}-{n}"))
+            yield
+            self.step("save score", lambda: click(at, "Save Score"))
+            yield
+        self.session_bytes = session_state_size(at)
+
+
+def run_worker(args, worker):
+    os.chdir(ROOT)
+    sys.path.insert(0, ROOT)
+    import background
+
+    random.seed(args.seed + worker)
+    # Warm up imports and shared caches so memory growth reflects sessions only
+    warmup = AppTest.from_file(APP, default_timeout=args.timeout)
+    warmup.secrets["leaderboard"] = leaderboard_secrets(args)
+    warmup.run()
+    if args.trace_memory:
+        tracemalloc.start()
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    students = [Student(args, f"w{worker}-s{i}") for i in range(args.sessions)]
+    running = {s: s.run(args.quizzes) for s in students}
+    errors = []
+    started = time.perf_counter()
+    while running:
+        for student, steps in list(running.items()):
+            try:
+                next(steps)
+            except StopIteration:
+                del running[student]
+            except Exception as e:
+                errors.append(f"{student.name}: {e!r}")
+                del running[student]
+    elapsed = time.perf_counter() - started
+    # Pool workers exit without atexit hooks; sync saved scores first
+    background.flush_all(args.timeout)
+
+    timings = {}
+    for s in students:
+        for kind, values in s.timings.items():
+            timings.setdefault(kind, []).extend(values)
+    return {
+        'timings': timings,
+        'elapsed': elapsed,
+        'errors': errors,
+        'rss_growth_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before,
+        'peak_traced': tracemalloc.get_traced_memory()[1] if args.trace_memory else None,
+        'session_bytes': [s.session_bytes for s in students],
+    }
+
+
+def session_state_size(at):
+    size = 0
+    for key, value in at.session_state.to_dict().items():
+        try:
+            size += len(pickle.dumps(value))
+        except Exception:
+            pass
+    return size
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    k = (len(ordered) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def summarize(timings):
+    summary = {}
+    for kind, values in timings.items():
+        summary[kind] = {
+            'count': len(values),
+            'mean_ms': statistics.fmean(values) * 1000,
+            'p50_ms': percentile(values, 50) * 1000,
+            'p95_ms': percentile(values, 95) * 1000,
+            'p99_ms': percentile(values, 99) * 1000,
+        }
+    return summary
+
+
+def count_scores(path):
+    if not os.path.exists(path):
+        return 0
+    with sqlite3.connect(path) as conn:
+        try:
+            return conn.execute("SELECT COUNT(*) FROM scores").fetchone()[0]
+        except sqlite3.OperationalError:
+            return 0
+
+
+def run(args, processes):
+    args = argparse.Namespace(**vars(args))
+    if args.backend == "sqlite" and not args.db:
+        args.db = os.path.join(tempfile.mkdtemp(prefix="sainsquiz-bench-"), "leaderboard.db")
+    stored_before = count_scores(args.db) if args.backend == "sqlite" else None
+
+    # An in-process run replaces __main__ (AppTest runs the app as __main__),
+    # so a scaling series starts every run, even one worker, in a fresh pool
+    if processes > 1 or args.scaling:
+        with multiprocessing.Pool(processes) as pool:
+            workers = pool.starmap(run_worker, [(args, w) for w in range(processes)])
+    else:
+        workers = [run_worker(args, 0)]
+
+    timings, errors = {}, []
+    for w in workers:
+        errors.extend(w['errors'])
+        for kind, values in w['timings'].items():
+            timings.setdefault(kind, []).extend(values)
+    all_reruns = [v for values in timings.values() for v in values]
+    timings["all reruns"] = all_reruns
+    elapsed = max(w['elapsed'] for w in workers)
+    sessions = args.sessions * processes
+    rss_growth_mb = sum(w['rss_growth_kb'] for w in workers) / 1024
+
+    return {
+        'backend': args.backend,
+        'sessions': sessions,
+        'processes': processes,
+        'quizzes_per_session': args.quizzes,
+        'latency_s': args.latency,
+        'elapsed_s': elapsed,
+        'reruns_per_s': len(all_reruns) / elapsed if elapsed else 0.0,
+        'quizzes_per_s': sessions * args.quizzes / elapsed if elapsed else 0.0,
+        'rss_growth_mb': rss_growth_mb,
+        'rss_growth_mb_per_session': rss_growth_mb / max(sessions, 1),
+        'peak_traced_mb': (sum(w['peak_traced'] for w in workers) / 1e6) if args.trace_memory else None,
+        'session_state_bytes': statistics.fmean([b for w in workers for b in w['session_bytes']]),
+        # Scores saved by all workers and how many of them reached the shared file
+        'saved_scores': sessions * args.quizzes,
+        'stored_scores': count_scores(args.db) - stored_before if stored_before is not None else None,
+        'errors': errors,
+        'steps': summarize(timings),
+    }
+
+
+def report(args, results):
+    print(f"{results['sessions']} sessions in {results['processes']} process(es) x {args.quizzes} quizzes, "
+          f"{args.backend} backend, latency {args.latency * 1000:.0f} ms")
+    print(f"{'step':<16}{'count':>7}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}  (ms)")
+    for kind, row in results['steps'].items():
+        print(f"{kind:<16}{row['count']:>7}{row['mean_ms']:>10.1f}{row['p50_ms']:>10.1f}"
+              f"{row['p95_ms']:>10.1f}{row['p99_ms']:>10.1f}")
+    print(f"throughput: {results['reruns_per_s']:.1f} reruns/s, {results['quizzes_per_s']:.2f} quizzes/s")
+    print(f"memory: {results['rss_growth_mb']:.1f} MB RSS growth, "
+          f"{results['rss_growth_mb_per_session']:.2f} MB/session, "
+          f"{results['session_state_bytes']:.0f} B session state per session")
+    if args.trace_memory:
+        print(f"traced: {results['peak_traced_mb']:.1f} MB peak Python allocations")
+    if results['stored_scores'] is not None:
+        print(f"shared leaderboard: {results['stored_scores']}/{results['saved_scores']} saved scores stored")
+    for error in results['errors']:
+        print(f"error: {error}")
+
+
+def consistent(results):
+    return results['stored_scores'] is None or results['stored_scores'] == results['saved_scores']
+
+
+# Same per-worker load at each process count; ideal scaling keeps
+# efficiency (speedup / process ratio) at 1.0 until the host runs out of cores
+def report_scaling(runs):
+    base = runs[0]
+    print(f"{'processes':>9}{'reruns/s':>11}{'speedup':>9}{'efficiency':>12}{'p95 ms':>9}  stored")
+    for results in runs:
+        speedup = results['reruns_per_s'] / base['reruns_per_s'] if base['reruns_per_s'] else 0.0
+        efficiency = speedup / (results['processes'] / base['processes'])
+        stored = "-" if results['stored_scores'] is None else \
+            f"{results['stored_scores']}/{results['saved_scores']}"
+        print(f"{results['processes']:>9}{results['reruns_per_s']:>11.1f}{speedup:>9.2f}{efficiency:>12.2f}"
+              f"{results['steps']['all reruns']['p95_ms']:>9.1f}  {stored}")
+    print(f"({os.cpu_count()} CPUs on this host)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=4, help="students per worker process")
+    parser.add_argument("--processes", type=int, default=1, help="parallel worker processes")
+    parser.add_argument("--scaling", help="comma-separated process counts to compare, e.g. 1,2,4")
+    parser.add_argument("--quizzes", type=int, default=2, help="quizzes per student")
+    parser.add_argument("--backend", choices=["fake_sheets", "sqlite", "memory"], default="fake_sheets",
+                        help="leaderboard storage (fake_sheets and memory are per process)")
+    parser.add_argument("--db", help="SQLite file for --backend sqlite (default: a new temporary file per run)")
+    parser.add_argument("--latency", type=float, default=0.1, help="fake Sheets latency per call (s)")
+    parser.add_argument("--timeout", type=float, default=30, help="per-rerun timeout (s)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--trace-memory", action="store_true", help="also trace Python allocations (slow)")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="fail if p95 is worse than this saved result")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p95 regression (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    if args.scaling:
+        runs = []
+        for processes in [int(n) for n in args.scaling.split(",")]:
+            runs.append(run(args, processes))
+            report(args, runs[-1])
+            print()
+        report_scaling(runs)
+        if args.save:
+            with open(args.save, "w", encoding="utf-8") as f:
+                json.dump({'scaling': runs}, f, indent=2, ensure_ascii=False)
+        return 1 if any(r['errors'] or not consistent(r) for r in runs) else 0
+
+    results = run(args, args.processes)
+    report(args, results)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+    status = 1 if results['errors'] or not consistent(results) else 0
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        for kind, row in results['steps'].items():
+            before = baseline['steps'].get(kind)
+            if before and row['p95_ms'] > before['p95_ms'] * (1 + args.tolerance):
+                print(f"REGRESSION {kind}: p95 {before['p95_ms']:.1f} -> {row['p95_ms']:.1f} ms")
+                status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
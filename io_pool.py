@@ -0,0 +1,145 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+# ---------- I/O POOL ----------
+# Runs blocking storage calls (Google Sheets reads and connects) on a few
+# background threads, so the script thread never waits on the network.
+# submit() returns a concurrent.futures.Future: a rerun starts the call
+# early, renders, and only then waits for it with a small time budget
+# (wait()); a result that arrives later is picked up by a later rerun.
+# While a call submitted under a key is running, submitting the same key
+# returns its future instead of starting the call again.
+class IOPool:
+    def __init__(self, max_workers=4, name="io"):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._running = {}
+
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.last_latency = None
+        self.last_error = None
+
+    def submit(self, key, fn, *args, **kwargs):
+        with self._lock:
+            future = self._running.get(key)
+            if future is not None:
+                return future
+            future = self._executor.submit(self._call, fn, args, kwargs)
+            self._running[key] = future
+            self.submitted += 1
+        future.add_done_callback(lambda _: self._done(key, future))
+        return future
+
+    def running(self, key):
+        with self._lock:
+            return self._running.get(key)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'running': len(self._running),
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+                'last_latency': self.last_latency,
+            }
+
+    def _call(self, fn, args, kwargs):
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            self.last_error = f"{type(e).__name__}: {e}"
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            self.last_latency = time.perf_counter() - started
+
+    def _done(self, key, future):
+        with self._lock:
+            if self._running.get(key) is future:
+                del self._running[key]
+            self.completed += 1
+
+
+# Waits up to `timeout` seconds; True if the call finished and succeeded
+def wait(future, timeout):
+    if future is None:
+        return False
+    try:
+        future.result(timeout)
+        return True
+    except Exception:
+        return False
+
+
+# ---------- STALE-WHILE-REVALIDATE ----------
+# Keeps a value that some other object holds (the leaderboard engine) fresh
+# without anyone waiting for it. Readers always get the last known value at
+# once; poke() starts a background refresh on the pool when the value is
+# older than refresh_after seconds or the source reports a new version, and
+# at most one refresh runs at a time (single flight: pokes while one is
+# running share it). age is seconds since the last successful refresh;
+# past max_stale the value is reported as stale, e.g. while the source is
+# down, but it is still served.
+class Revalidator:
+    def __init__(self, pool, key, refresh_after=30.0, max_stale=300.0, clock=time.monotonic):
+        self.pool = pool
+        self.key = key
+        self.refresh_after = refresh_after
+        self.max_stale = max_stale
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._started = None
+        self._version = None
+        self.refreshed_at = None
+
+        self.refreshes = 0
+        self.coalesced = 0
+        self.failures = 0
+
+    @property
+    def age(self):
+        return None if self.refreshed_at is None else self.clock() - self.refreshed_at
+
+    @property
+    def stale(self):
+        return self.refreshed_at is not None and self.age > self.max_stale
+
+    # Returns the future of the running refresh, or None when none is due
+    def poke(self, fn, *args, version=None):
+        running = self.pool.running(self.key)
+        with self._lock:
+            due = (self._started is None or self.clock() - self._started >= self.refresh_after
+                   or (version is not None and version != self._version))
+            if not due:
+                return running
+            if running is not None:
+                self.coalesced += 1
+                return running
+            self._started, self._version = self.clock(), version
+            self.refreshes += 1
+        future = self.pool.submit(self.key, fn, *args)
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future):
+        if future.exception() is None:
+            self.refreshed_at = self.clock()
+        else:
+            self.failures += 1
+
+    def stats(self):
+        return {
+            'age_seconds': self.age,
+            'max_stale_seconds': self.max_stale,
+            'stale': self.stale,
+            'refreshes': self.refreshes,
+            'coalesced': self.coalesced,
+            'failures': self.failures,
+        }
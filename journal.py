@@ -0,0 +1,272 @@
+import atexit
+import glob
+import json
+import os
+import random
+import re
+import threading
+import time
+
+import background
+
+
+# ---------- JOURNAL ----------
+# Durable, append-only log in front of a slow or unreliable store. append()
+# returns once the row is on local disk (written and fsynced), so nothing
+# acknowledged is lost if the store is down or the process dies. Concurrent
+# appends share fsyncs: whoever syncs first covers every row written before
+# it (group commit), so a burst of saves costs a few fsyncs, not one each.
+#
+# A background syncer sends unsynced rows to flush_rows(rows, verify) in
+# batches, in order, and records how far it got in a sidecar file
+# (<journal>.synced). Until that is recorded a sent batch may be sent again,
+# e.g. after a crash or a timed-out write that landed anyway. Rows therefore
+# carry their own dedup key, and verify=True asks flush_rows to skip rows
+# the store already has. It is set whenever the previous outcome is unknown:
+# after startup, after a failed attempt and for adopted journals.
+#
+# Files are one per process, <prefix>.<pid>.jsonl, so processes never write
+# to the same file. Journals of a process that is no longer running (see
+# OwnerLock in background.py) are adopted by renaming them to
+# <prefix>.<pid>-<n>.jsonl (atomic, so only one process gets each); a live
+# owner's journal is never taken, however long its syncer is stuck. Once a
+# journal is fully synced it is truncated (own) or deleted (adopted).
+class Journal:
+    def __init__(self, prefix, flush_rows, batch_size=200, interval=1.0, backoff=0.5,
+                 max_backoff=60.0, compact_bytes=1 << 20, name="journal-sync"):
+        self.prefix = prefix
+        self.flush_rows = flush_rows
+        self.batch_size = batch_size
+        self.interval = interval
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.compact_bytes = compact_bytes
+
+        directory = os.path.dirname(prefix)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Held before any journal file is written
+        self._owner_lock = background.OwnerLock(prefix)
+        self.path = f"{prefix}.{os.getpid()}.jsonl"
+        self._pattern = re.compile(re.escape(prefix) + r"\.(\d+)(?:-\d+)?\.jsonl")
+        self._lock = threading.Lock()
+        self._fsync_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._idle = threading.Event()
+        self._stopped = threading.Event()
+        self._written = 0
+        self._durable = 0
+        self._adopted = 0
+        # Journals this process syncs: path -> verify the next batch
+        self._owned = {}
+
+        self.appended = 0
+        self.fsyncs = 0
+        self.synced_rows = 0
+        self.synced_batches = 0
+        self.failed_batches = 0
+        self.adopted_journals = 0
+        self.last_sync_latency = None
+        self.last_error = None
+
+        self._repair(self.path)
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND | getattr(os, "O_BINARY", 0),
+                           0o644)
+        self._owned[self.path] = True
+        for path in self._files():
+            if self._owner(path) == os.getpid():
+                self._owned[path] = True
+
+        self._worker = threading.Thread(target=self._run, name=name, daemon=True)
+        self._worker.start()
+        atexit.register(self.close)
+        background.register(self)
+
+    def append(self, row):
+        line = json.dumps(row, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+        with self._lock:
+            self._idle.clear()
+            os.write(self._fd, line)
+            self._written += 1
+            seq = self._written
+            self.appended += 1
+        with self._fsync_lock:
+            if self._durable < seq:
+                with self._lock:
+                    target = self._written
+                os.fsync(self._fd)
+                self.fsyncs += 1
+                self._durable = target
+        self._wake.set()
+        return True
+
+    def stats(self):
+        return {
+            'appended': self.appended,
+            'fsyncs': self.fsyncs,
+            'synced_rows': self.synced_rows,
+            'synced_batches': self.synced_batches,
+            'failed_batches': self.failed_batches,
+            'unsynced_bytes': self.unsynced_bytes(),
+            'adopted_journals': self.adopted_journals,
+            'last_sync_latency': self.last_sync_latency,
+            'last_error': self.last_error,
+        }
+
+    def unsynced_bytes(self):
+        total = 0
+        for path in list(self._owned):
+            try:
+                total += max(os.path.getsize(path) - self._offset(path), 0)
+            except OSError:
+                pass
+        return total
+
+    def flush(self, timeout=None):
+        # Block until everything appended so far has been synced
+        self._wake.set()
+        return self._idle.wait(timeout)
+
+    def close(self, timeout=10.0):
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        self._wake.set()
+        self._worker.join(timeout)
+
+    # ---------- SYNCER ----------
+    def _run(self):
+        failures = 0
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            seen = self._written
+            try:
+                self._sync()
+                failures = 0
+                with self._lock:
+                    if self._written == seen and not self.unsynced_bytes():
+                        self._idle.set()
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                self.failed_batches += 1
+                failures += 1
+                if not self._stopped.is_set():
+                    delay = min(self.backoff * (2 ** (failures - 1)), self.max_backoff)
+                    self._stopped.wait(delay + random.uniform(0, delay))
+            if self._stopped.is_set():
+                return
+
+    def _sync(self):
+        self._adopt()
+        for path in list(self._owned):
+            offset = self._offset(path)
+            while True:
+                rows, end = self._read(path, offset)
+                if end == offset:
+                    break
+                if rows:
+                    started = time.perf_counter()
+                    try:
+                        self.flush_rows(rows, self._owned[path])
+                    except Exception:
+                        # A failed write may still have landed
+                        self._owned[path] = True
+                        raise
+                    self.last_sync_latency = time.perf_counter() - started
+                    self.synced_rows += len(rows)
+                    self.synced_batches += 1
+                self._owned[path] = False
+                offset = end
+                self._save_offset(path, offset)
+            self._finish(path, offset)
+
+    def _finish(self, path, offset):
+        if path != self.path:
+            if offset >= os.path.getsize(path):
+                self._remove(path)
+                self._remove(path + ".synced")
+                del self._owned[path]
+            return
+        if offset < self.compact_bytes:
+            return
+        # Offset first: a crash in between only resends rows, with verify on
+        with self._lock:
+            if os.fstat(self._fd).st_size == offset:
+                self._save_offset(path, 0)
+                os.ftruncate(self._fd, 0)
+
+    # Complete lines from offset on, at most batch_size rows; lines that do
+    # not parse are skipped. Returns (rows, offset after them).
+    def _read(self, path, offset):
+        rows = []
+        with open(path, "rb") as f:
+            f.seek(offset)
+            while len(rows) < self.batch_size:
+                line = f.readline()
+                if not line.endswith(b"\n"):
+                    break
+                offset += len(line)
+                try:
+                    rows.append(json.loads(line))
+                except ValueError:
+                    pass
+        return rows, offset
+
+    # ---------- FILES ----------
+    def _files(self):
+        return [p for p in glob.glob(glob.escape(self.prefix) + ".*.jsonl") if self._pattern.fullmatch(p)]
+
+    def _owner(self, path):
+        return int(self._pattern.fullmatch(path).group(1))
+
+    def _adopt(self):
+        for path in self._files():
+            if path in self._owned or self._owner_lock.alive(self._owner(path)):
+                continue
+            self._adopted += 1
+            target = f"{self.prefix}.{os.getpid()}-{self._adopted}.jsonl"
+            try:
+                offset = self._offset(path)
+                os.rename(path, target)
+            except OSError:
+                # Another process adopted it first
+                continue
+            self._repair(target)
+            self._save_offset(target, offset)
+            self._remove(path + ".synced")
+            self._owned[target] = True
+            self.adopted_journals += 1
+        self._owner_lock.prune()
+
+    def _offset(self, path):
+        try:
+            with open(path + ".synced", "r", encoding="utf-8") as f:
+                offset = int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+        # A journal truncated after its offset was saved starts over
+        return offset if offset <= os.path.getsize(path) else 0
+
+    def _save_offset(self, path, offset):
+        tmp_path = path + ".synced.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(str(offset))
+        os.replace(tmp_path, path + ".synced")
+
+    # A crash mid-append can leave a partial last line; cut it off before
+    # appending so the next row does not get glued to it
+    def _repair(self, path):
+        try:
+            with open(path, "rb+") as f:
+                data = f.read()
+                if data and not data.endswith(b"\n"):
+                    f.truncate(data.rfind(b"\n") + 1)
+        except FileNotFoundError:
+            pass
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
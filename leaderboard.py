@@ -0,0 +1,214 @@
+import functools
+import heapq
+import threading
+from datetime import datetime, timedelta
+
+WINDOWS = ("all", "week", "day")
+MAX_PENDING = 1000
+
+
+# First day of the day and week windows containing `now`, as "YYYY-MM-DD"
+# (weeks start on Monday). Row dates compare against these as strings.
+def window_starts(now):
+    return _buckets(now.strftime("%Y-%m-%d"))
+
+
+@functools.lru_cache(maxsize=1024)
+def _buckets(day):
+    date = datetime.strptime(day, "%Y-%m-%d")
+    monday = date - timedelta(days=date.weekday())
+    return {"day": day, "week": monday.strftime("%Y-%m-%d")}
+
+
+# ---------- INCREMENTAL LEADERBOARD ----------
+# Remembers the last row it ingested from a storage backend and only fetches
+# rows appended after it. A full rescan only happens when the header changes
+# or the backend shrinks (the last ingested row no longer matches what is
+# stored there).
+#
+# Every view (overall or one subject, for all time, this week or today) is
+# a bounded min-heap of its top N, so a new row costs O(log N) for each of
+# the at most six views it belongs to, and reading a view costs O(N) no
+# matter how many rows are stored. Each view has its own version, which
+# only changes when that view's entries may have. Day and week views only
+# cover the current day and week; they start empty when those roll over.
+#
+# Scores saved by this process are added as pending entries so they show up
+# straight away (flagged as pending); each one is dropped once its row
+# arrives from the backend. last_sync is when the last refresh finished, or
+# None before the first one.
+class IncrementalLeaderboard:
+    def __init__(self, size=10, clock=datetime.now):
+        self.size = size
+        self.clock = clock
+        self.full_scans = 0
+        self.rows_ingested = 0
+        self.last_sync = None
+        self._lock = threading.RLock()
+        self._pending = []
+        self._seq = 0
+        self.version = 0
+        self._starts = window_starts(clock())
+        self._reset(None)
+
+    def _reset(self, header):
+        self.header = header
+        self._last = None
+        self._views = {}
+        self.version += 1
+        self._base_version = self.version
+        self._versions = {}
+        # Pending entries outlive a rescan; their views must not share the
+        # base version with views that are really empty
+        for _, _, _, date, subject in self._pending:
+            for key in self._keys(subject, date):
+                self._touch(key)
+
+    def _touch(self, key):
+        self.version += 1
+        self._versions[key] = self.version
+
+    def refresh(self, backend):
+        with self._lock:
+            self._roll()
+            header, rows = backend.read_from(self._last[0] if self._last else None)
+
+            if header != self.header:
+                self._rescan(backend)
+            elif self._last is not None:
+                if not rows or (rows[0][0], self._pad(rows[0][1])) != self._last:
+                    self._rescan(backend)
+                else:
+                    self._ingest(rows[1:])
+            else:
+                self._ingest(rows)
+            self.last_sync = self.clock()
+            return self.top()
+
+    def add_pending(self, name, score, date, subject=None):
+        # Same filter as rows read back from the backend
+        if not name.strip() or score <= 0:
+            return
+        with self._lock:
+            self._seq += 1
+            self._pending.append((score, -self._seq, name.strip(), date, subject or None))
+            if len(self._pending) > MAX_PENDING:
+                self._pending.pop(0)
+            for key in self._keys(subject or None, date):
+                self._touch(key)
+
+    def top(self, subject=None, window="all"):
+        return self.snapshot(subject, window)[1]
+
+    # (version, top entries) of one view, as (name, score, pending) tuples;
+    # the version changes whenever the entries may have
+    def snapshot(self, subject=None, window="all"):
+        key = (subject or None, window)
+        with self._lock:
+            self._roll()
+            ranked = [(score, seq, name, False) for score, seq, name in self._views.get(key, ())]
+            for score, seq, name, date, p_subject in self._pending:
+                if key in self._keys(p_subject, date):
+                    ranked.append((score, seq, name, True))
+            ranked = sorted(ranked, reverse=True)[:self.size]
+            version = self._versions.get(key, self._base_version)
+        return version, [(name, score, pending) for score, _, name, pending in ranked]
+
+    def subjects(self):
+        with self._lock:
+            return sorted({subject for subject, _ in self._views if subject})
+
+    # The views a row belongs to
+    def _keys(self, subject, date):
+        keys = [(None, "all")]
+        if subject:
+            keys.append((subject, "all"))
+        if date and len(date) >= 10:
+            try:
+                buckets = _buckets(date[:10])
+            except ValueError:
+                return keys
+            for window in ("week", "day"):
+                if buckets[window] == self._starts[window]:
+                    keys.append((None, window))
+                    if subject:
+                        keys.append((subject, window))
+        return keys
+
+    def _roll(self):
+        starts = window_starts(self.clock())
+        if starts == self._starts:
+            return
+        for window in ("week", "day"):
+            if starts[window] != self._starts[window]:
+                for key in [k for k in self._views if k[1] == window]:
+                    del self._views[key]
+                for key in [k for k in self._versions if k[1] == window]:
+                    self._touch(key)
+        self._starts = starts
+
+    def _rescan(self, backend):
+        header, rows = backend.scan(self.size, since=sorted(set(self._starts.values())))
+        self._reset(header)
+        self.full_scans += 1
+        self._ingest(rows)
+
+    def _pad(self, values):
+        width = len(self.header or [])
+        return values + [""] * (width - len(values))
+
+    def _column(self, name):
+        try:
+            return self.header.index(name)
+        except (AttributeError, ValueError):
+            return None
+
+    def _ingest(self, rows):
+        if not rows:
+            return
+        name_col, score_col = self._column('Name'), self._column('Score')
+        date_col, subject_col = self._column('Date'), self._column('Subject')
+        if name_col is None or score_col is None:
+            name_col = score_col = None
+
+        for cursor, values in rows:
+            values = self._pad(values)
+            self._last = (cursor, values)
+            self.rows_ingested += 1
+            if name_col is None:
+                continue
+            try:
+                score = int(float(values[score_col]))
+                name = str(values[name_col]).strip()
+            except (IndexError, ValueError):
+                continue
+            if name and score > 0:
+                date = values[date_col] if date_col is not None else None
+                subject = (values[subject_col] or None) if subject_col is not None else None
+                self._seq += 1
+                item = (score, -self._seq, name)
+                for key in self._keys(subject, date):
+                    self._push(key, item)
+                if self._pending:
+                    self._settle(name, score, date, subject)
+
+    def _settle(self, name, score, date, subject):
+        for i, (p_score, _, p_name, p_date, p_subject) in enumerate(self._pending):
+            if (p_name, p_score) == (name, score) and (date is None or p_date == date) \
+                    and (subject is None or p_subject == subject):
+                del self._pending[i]
+                for key in self._keys(p_subject, p_date):
+                    self._touch(key)
+                return
+
+    def _push(self, key, item):
+        # Ties keep append order: among equal scores the earliest row ranks
+        # higher, so the heap evicts the largest sequence number first
+        heap = self._views.setdefault(key, [])
+        if len(heap) < self.size:
+            heapq.heappush(heap, item)
+        elif item > heap[0]:
+            heapq.heapreplace(heap, item)
+        else:
+            return
+        self._touch(key)
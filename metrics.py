@@ -0,0 +1,239 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+# ---------- REGISTRY ----------
+# Process-wide counters, gauges and histograms keyed by name and labels,
+# rendered in the Prometheus text exposition format. Gauges that mirror
+# other objects (queue depth, ...) are read through collectors at render time.
+class Registry:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._help = {}
+        self._collectors = []
+
+    def describe(self, name, text):
+        self._help[name] = text
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._gauges[(name, _labels(labels))] = value
+
+    def observe(self, name, value, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = [[0] * len(self.buckets), 0, 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    hist[0][i] += 1
+            hist[1] += 1
+            hist[2] += value
+
+    def add_collector(self, collect):
+        # collect() returns [(name, value, labels_dict), ...] gauges
+        self._collectors.append(collect)
+
+    def counter(self, name, **labels):
+        return self._counters.get((name, _labels(labels)), 0)
+
+    def samples(self, name):
+        with self._lock:
+            return [(dict(labels), value) for (n, labels), value in self._counters.items() if n == name]
+
+    def render(self):
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            histograms = {k: (list(v[0]), v[1], v[2]) for k, v in self._histograms.items()}
+        for collect in self._collectors:
+            try:
+                for name, value, labels in collect():
+                    gauges[(name, _labels(labels))] = value
+            except Exception:
+                pass
+
+        lines = []
+        for kind, series in (("counter", counters), ("gauge", gauges)):
+            for name in sorted({n for (n, _), v in series.items() if v is not None}):
+                self._header(lines, name, kind)
+                for (n, labels), value in sorted(series.items()):
+                    if n == name and value is not None:
+                        lines.append(f"{name}{_fmt(labels)} {_num(value)}")
+        for name in sorted({n for n, _ in histograms}):
+            self._header(lines, name, "histogram")
+            for (n, labels), (counts, count, total) in sorted(histograms.items()):
+                if n != name:
+                    continue
+                for bound, bucket in zip(self.buckets, counts):
+                    lines.append(f"{name}_bucket{_fmt(labels + (('le', _num(bound)),))} {bucket}")
+                lines.append(f"{name}_bucket{_fmt(labels + (('le', '+Inf'),))} {count}")
+                lines.append(f"{name}_sum{_fmt(labels)} {_num(total)}")
+                lines.append(f"{name}_count{_fmt(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def _header(self, lines, name, kind):
+        if name in self._help:
+            lines.append(f"# HELP {name} {self._help[name]}")
+        lines.append(f"# TYPE {name} {kind}")
+
+
+def _labels(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt(labels):
+    if not labels:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in labels)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + "}"
+
+
+def _num(value):
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+# ---------- PER-RERUN TIMER ----------
+# One per script run. phase() times a block; lap() closes the section that
+# started at the previous lap or mark() (or at the start of the run). Every timing is
+# kept for the debug panel and observed into sainsquiz_phase_seconds.
+class RerunTimer:
+    def __init__(self, registry):
+        self.registry = registry
+        self.started = time.perf_counter()
+        self._last_lap = self.started
+        self.phases = []
+
+    def record(self, phase, seconds):
+        self.phases.append((phase, seconds))
+        self.registry.observe("sainsquiz_phase_seconds", seconds, phase=phase)
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def mark(self):
+        self._last_lap = time.perf_counter()
+
+    def lap(self, name):
+        now = time.perf_counter()
+        self.record(name, now - self._last_lap)
+        self._last_lap = now
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def finish(self):
+        total = self.elapsed()
+        self.registry.observe("sainsquiz_rerun_seconds", total)
+        self.registry.inc("sainsquiz_reruns_total")
+        return total
+
+
+# ---------- CACHE HIT/MISS ----------
+# Streamlit does not report cache hits, so cached functions call
+# note_miss() in their body and callers go through cached_call(), which
+# counts a hit whenever the body did not run on this thread.
+_miss_flag = threading.local()
+
+
+def note_miss():
+    _miss_flag.missed = True
+
+
+def cached_call(registry, name, fn, *args, **kwargs):
+    _miss_flag.missed = False
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        result = "miss" if getattr(_miss_flag, "missed", False) else "hit"
+        registry.inc("sainsquiz_cache_requests_total", cache=name, result=result)
+
+
+# ---------- EXTERNAL CALLS ----------
+# Wraps the given methods on one object so every call is counted and timed.
+def instrument_calls(registry, obj, methods, target):
+    for method in methods:
+        original = getattr(obj, method, None)
+        if original is None:
+            continue
+
+        def wrapper(*args, _original=original, _method=method, **kwargs):
+            started = time.perf_counter()
+            status = "ok"
+            try:
+                return _original(*args, **kwargs)
+            except Exception:
+                status = "error"
+                raise
+            finally:
+                registry.inc("sainsquiz_external_calls_total", target=target, op=_method, status=status)
+                registry.observe("sainsquiz_external_call_seconds", time.perf_counter() - started,
+                                 target=target, op=_method)
+
+        setattr(obj, method, wrapper)
+    return obj
+
+
+# ---------- EXPORT ----------
+def start_http_server(registry, port, host="127.0.0.1"):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, int(port)), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+# Rewrites the file every `interval` seconds (atomically, for node_exporter's
+# textfile collector or plain tailing).
+def start_file_writer(registry, path, interval=15.0):
+    def write_forever():
+        while True:
+            tmp_path = path + ".tmp"
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    f.write(registry.render())
+                os.replace(tmp_path, path)
+            except OSError:
+                pass
+            time.sleep(interval)
+
+    thread = threading.Thread(target=write_forever, name="metrics-file", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,507 @@
+import argparse
+import functools
+import hashlib
+import json
+import mmap
+import os
+import random
+import struct
+import sys
+import threading
+import time
+from array import array
+
+FACETS = ('subject', 'topic', 'difficulty')
+
+# For each set of facets a question has, the facet combinations it is filed under
+_SUBSETS = [[m for m in range(1 << len(FACETS)) if m & ~present == 0]
+            for present in range(1 << len(FACETS))]
+
+
+# ---------- QUESTION RECORD ----------
+# One slotted record per question, shared by every session. Facet values and
+# options repeat across the bank, so they are interned to a single copy.
+class Question:
+    __slots__ = ('id', 'subject', 'topic', 'difficulty', 'question', 'options',
+                 'correct_option', 'explanation')
+
+    def __init__(self, qid, subject, question, options, correct_option, explanation,
+                 topic=None, difficulty=None):
+        self.id = qid
+        self.subject = _intern(subject)
+        self.topic = _intern(topic)
+        self.difficulty = _intern(difficulty)
+        self.question = question
+        self.options = tuple(_intern(o) for o in options)
+        self.correct_option = int(correct_option)
+        self.explanation = explanation
+
+    @classmethod
+    def from_dict(cls, qid, data):
+        return cls(qid, data['subject'], data['question'], data['options'],
+                   data['correct_option'], data.get('explanation', ""),
+                   topic=data.get('topic'), difficulty=data.get('difficulty'))
+
+    @property
+    def correct_answer(self):
+        return self.options[self.correct_option]
+
+    def __repr__(self):
+        return f"Question({self.id}, {self.subject!r}, {self.question[:40]!r})"
+
+
+# ---------- VALIDATION ----------
+class QuestionBankError(ValueError):
+    def __init__(self, message, errors=()):
+        self.errors = list(errors)
+        if self.errors:
+            message = f"{message}:\n" + "\n".join(f"  - {e}" for e in self.errors)
+        super().__init__(message)
+
+
+def _is_text(value):
+    return isinstance(value, str) and value.strip() != ""
+
+
+def validate_question(q):
+    if not isinstance(q, dict):
+        return ["is not an object"]
+    errors = []
+    for field in ('subject', 'question', 'explanation'):
+        if not _is_text(q.get(field)):
+            errors.append(f"'{field}' must be a non-empty string")
+    for field in ('topic', 'difficulty'):
+        if field in q and q[field] is not None and not _is_text(q[field]):
+            errors.append(f"'{field}' must be a non-empty string when given")
+
+    options = q.get('options')
+    if not isinstance(options, list) or len(options) < 2 or not all(_is_text(o) for o in options):
+        errors.append("'options' must be a list of at least 2 non-empty strings")
+        options = None
+    elif len(set(options)) != len(options):
+        errors.append("'options' contains duplicates")
+
+    correct = q.get('correct_option')
+    if not isinstance(correct, int) or isinstance(correct, bool):
+        errors.append("'correct_option' must be an integer")
+    elif options is not None and not 0 <= correct < len(options):
+        errors.append(f"'correct_option' {correct} is out of range for {len(options)} options")
+    return errors
+
+
+# Returns the valid questions with duplicates (same subject and question
+# text, ignoring case and spacing) removed, plus notes about what was dropped.
+# Raises QuestionBankError listing every invalid entry.
+def validate_questions(questions):
+    if not isinstance(questions, list):
+        raise QuestionBankError("The question bank must be a JSON list")
+    errors, notes, seen, clean = [], [], {}, []
+    for i, q in enumerate(questions):
+        problems = validate_question(q)
+        if problems:
+            errors.extend(f"question {i}: {p}" for p in problems)
+            continue
+        key = (q['subject'].strip(), " ".join(q['question'].split()).casefold())
+        if key in seen:
+            notes.append(f"question {i}: duplicate of question {seen[key]}, skipped")
+            continue
+        seen[key] = i
+        clean.append(q)
+    if errors:
+        raise QuestionBankError(f"{len(errors)} problem(s) in the question bank", errors)
+    if not clean:
+        raise QuestionBankError("The question bank is empty")
+    return clean, notes
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+# ---------- FACET INDEX ----------
+# Every question is filed under each combination of its facets (subject,
+# topic, difficulty), with None meaning "any". A filtered quiz is then a
+# dict lookup plus random.sample over the matching ids, which picks k items
+# in O(k) for pools larger than a few dozen questions instead of scanning
+# the whole bank.
+def facet_keys(facets):
+    present = 0
+    for i, value in enumerate(facets):
+        if value is not None:
+            present |= 1 << i
+    return [tuple(value if mask & (1 << i) else None for i, value in enumerate(facets))
+            for mask in _SUBSETS[present]]
+
+
+def build_index(facet_rows):
+    index = {}
+    values = {facet: set() for facet in FACETS}
+    for qid, facets in enumerate(facet_rows):
+        for i, value in enumerate(facets):
+            if value is not None:
+                values[FACETS[i]].add(value)
+        for key in facet_keys(facets):
+            ids = index.get(key)
+            if ids is None:
+                ids = index[key] = array('I')
+            ids.append(qid)
+    return index, values
+
+
+class _IndexedBank:
+    _index = {}
+    _values = {}
+
+    def values(self, facet):
+        return sorted(self._values[facet])
+
+    def ids(self, subject=None, topic=None, difficulty=None):
+        return self._index.get((subject, topic, difficulty), array('I'))
+
+    def count(self, subject=None, topic=None, difficulty=None):
+        return len(self.ids(subject, topic, difficulty))
+
+    def sample_ids(self, k, subject=None, topic=None, difficulty=None):
+        pool = self.ids(subject, topic, difficulty)
+        return random.sample(pool, min(k, len(pool)))
+
+    def sample(self, k, subject=None, topic=None, difficulty=None):
+        return [self[qid] for qid in self.sample_ids(k, subject, topic, difficulty)]
+
+
+# ---------- QUESTION BANK ----------
+# The whole bank in memory, built from a list of question dicts. Question
+# ids are positions in the bank, so sessions only need to keep lists of ints.
+class QuestionBank(_IndexedBank):
+    def __init__(self, questions):
+        self.questions = [q if isinstance(q, Question) else Question.from_dict(qid, q)
+                          for qid, q in enumerate(questions)]
+        self._index, self._values = build_index(
+            (q.subject, q.topic, q.difficulty) for q in self.questions)
+
+    def __len__(self):
+        return len(self.questions)
+
+    def __getitem__(self, qid):
+        return self.questions[qid]
+
+
+# ---------- LAZY QUESTION BANK ----------
+# For very large banks. Questions live one per line in a JSON Lines data
+# file that is memory-mapped; a small binary sidecar index holds the byte
+# offset of every line and the precomputed facet id lists. Startup only
+# reads the sidecar, and a question is parsed from the mapped file the
+# first time it is shown (recently used ones stay in an LRU cache).
+#
+# Sidecar layout (little-endian):
+#   magic "SQBX" | u32 meta length | meta JSON |
+#   u64 offsets[count + 1] | u32 ids for each key in meta["keys"], in order
+INDEX_MAGIC = b"SQBX"
+INDEX_VERSION = 1
+
+
+class LazyQuestionBank(_IndexedBank):
+    def __init__(self, data_path, index_path=None, cache_size=4096, source_path=None):
+        self.data_path = data_path
+        self.index_path = index_path or default_index_path(data_path)
+        try:
+            self.meta = self._read_index()
+        except (OSError, ValueError, KeyError, TypeError, struct.error) as e:
+            if isinstance(e, QuestionBankError):
+                raise
+            raise QuestionBankError(f"{self.index_path} is corrupt: {e}") from e
+        if source_path:
+            check_source(self.meta, source_path)
+
+        self._file = open(self.data_path, "rb")
+        try:
+            size = os.fstat(self._file.fileno()).st_size
+            if size != self.meta['data_size']:
+                raise QuestionBankError(f"{self.data_path} does not match its index {self.index_path}")
+            self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        except Exception:
+            self._file.close()
+            raise
+        self._load = functools.lru_cache(maxsize=cache_size)(self._read_question)
+
+    def __len__(self):
+        return self.meta['count']
+
+    def __getitem__(self, qid):
+        if not 0 <= qid < self.meta['count']:
+            raise IndexError(qid)
+        return self._load(qid)
+
+    def _read_question(self, qid):
+        line = self._data[self._offsets[qid]:self._offsets[qid + 1]]
+        return Question.from_dict(qid, json.loads(line))
+
+    def _read_index(self):
+        with open(self.index_path, "rb") as f:
+            if f.read(4) != INDEX_MAGIC:
+                raise QuestionBankError(f"{self.index_path} is not a question bank index")
+            (meta_len,) = struct.unpack("<I", f.read(4))
+            meta = json.loads(f.read(meta_len))
+            if meta.get('version') != INDEX_VERSION:
+                raise QuestionBankError(f"{self.index_path} has unsupported version {meta.get('version')}")
+
+            self._offsets = _read_array(f, 'Q', meta['count'] + 1)
+            self._index = {}
+            for *key, length in meta['keys']:
+                self._index[tuple(_intern(v) for v in key)] = _read_array(f, 'I', length)
+        self._values = {facet: set(meta['values'][facet]) for facet in FACETS}
+        return meta
+
+
+# A short content hash of the questions a bank serves, used as its version.
+# Every process that loads the same files gets the same version, so versions
+# can be compared across workers. A compiled bank uses the source hash it
+# recorded when compiled.
+def bank_fingerprint(bank):
+    meta = getattr(bank, "meta", None)
+    if meta is not None:
+        return (meta.get('source_sha256') or file_sha256(bank.data_path))[:12]
+    digest = hashlib.sha256()
+    for q in bank.questions:
+        digest.update(json.dumps([q.subject, q.topic, q.difficulty, q.question, q.options,
+                                  q.correct_option, q.explanation], ensure_ascii=False).encode("utf-8"))
+    return digest.hexdigest()[:12]
+
+
+# ---------- HOT RELOAD ----------
+# Watches the bank files by mtime and size. check() is cheap (a few stat
+# calls, at most once per check_interval) and never blocks: when a file
+# changed, the new bank is built on a background thread and swapped in under
+# a lock. Every bank is versioned by its fingerprint, and older versions stay
+# available through get() while quizzes that started on them keep asking for
+# them, so their question ids keep pointing at the same questions. A reload
+# that yields the same questions keeps the current version. on_reload(version)
+# runs after each new version is swapped in.
+class BankReloader:
+    def __init__(self, load, paths, check_interval=2.0, retain_seconds=3 * 3600,
+                 fingerprint=bank_fingerprint, on_reload=None):
+        self._load = load
+        self.paths = list(paths)
+        self.check_interval = check_interval
+        self.retain_seconds = retain_seconds
+        self.fingerprint = fingerprint
+        self.on_reload = on_reload
+        self.last_error = None
+        self.reloads = 0
+
+        self._lock = threading.Lock()
+        self._reloading = False
+        self._last_check = time.monotonic()
+        self._signature = self._stat()
+        bank = load()
+        self.version = fingerprint(bank)
+        self._generations = {self.version: [bank, time.monotonic()]}
+
+    @property
+    def current(self):
+        return self.latest()[1]
+
+    def latest(self):
+        with self._lock:
+            return self.version, self._generations[self.version][0]
+
+    def get(self, version):
+        with self._lock:
+            generation = self._generations.get(version)
+            if generation is None:
+                return None
+            generation[1] = time.monotonic()
+            return generation[0]
+
+    # force skips the check_interval throttle, e.g. when another process
+    # reported a newer version
+    def check(self, force=False):
+        now = time.monotonic()
+        if self._reloading or (not force and now - self._last_check < self.check_interval):
+            return False
+        self._last_check = now
+        signature = self._stat()
+        if signature == self._signature:
+            return False
+        with self._lock:
+            if self._reloading:
+                return False
+            self._reloading = True
+        threading.Thread(target=self._reload, args=(signature,),
+                         name="bank-reload", daemon=True).start()
+        return True
+
+    def _reload(self, signature):
+        try:
+            bank = self._load()
+            version = self.fingerprint(bank)
+        except Exception as e:
+            # Keep serving the previous bank; the error is retried once the files change again
+            self.last_error = e
+            print(f"question bank reload failed, still serving {self.version}: {e}", file=sys.stderr)
+            self._signature = signature
+            self._reloading = False
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._signature = signature
+            self.last_error = None
+            self._reloading = False
+            if version == self.version:
+                return
+            self.version = version
+            self._generations[version] = [bank, now]
+            for old, (_, used) in list(self._generations.items()):
+                if old != version and now - used > self.retain_seconds:
+                    del self._generations[old]
+            self.reloads += 1
+        if self.on_reload is not None:
+            self.on_reload(version)
+
+    def _stat(self):
+        signature = []
+        for path in self.paths:
+            try:
+                st = os.stat(path)
+                signature.append((path, st.st_mtime_ns, st.st_size))
+            except OSError:
+                signature.append((path, None, None))
+        return tuple(signature)
+
+
+def default_index_path(data_path):
+    return os.path.splitext(data_path)[0] + ".idx"
+
+
+def write_lazy_bank(questions, data_path, index_path=None, extra_meta=None):
+    index_path = index_path or default_index_path(data_path)
+    offsets = array('Q', [0])
+    facet_rows = []
+    # Both files are written under a temporary name and renamed into place.
+    # A running app may have the old data file memory-mapped; the rename
+    # leaves it its own inode, where truncating in place would pull the
+    # mapped pages out from under it (SIGBUS).
+    tmp_path = data_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        for q in questions:
+            line = json.dumps(q, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+            f.write(line)
+            offsets.append(offsets[-1] + len(line))
+            facet_rows.append(tuple(q.get(facet) for facet in FACETS))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, data_path)
+
+    index, values = build_index(facet_rows)
+    keys = sorted(index, key=lambda k: tuple("" if v is None else str(v) for v in k))
+    meta = dict(extra_meta or {})
+    meta.update({
+        'version': INDEX_VERSION,
+        'count': len(facet_rows),
+        'data_size': offsets[-1],
+        'values': {facet: sorted(values[facet]) for facet in FACETS},
+        'keys': [list(key) + [len(index[key])] for key in keys],
+    })
+    meta_bytes = json.dumps(meta, ensure_ascii=False).encode("utf-8")
+
+    # The data file goes first: a reader that sees the new data with the old
+    # index fails the data_size check and retries on the next change
+    tmp_path = index_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(INDEX_MAGIC)
+        f.write(struct.pack("<I", len(meta_bytes)))
+        f.write(meta_bytes)
+        _write_array(f, offsets)
+        for key in keys:
+            _write_array(f, index[key])
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, index_path)
+    return meta
+
+
+def _read_array(f, typecode, count):
+    values = array(typecode)
+    values.frombytes(f.read(count * values.itemsize))
+    if len(values) != count:
+        raise QuestionBankError("Question bank index is truncated")
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def _write_array(f, values):
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    f.write(values.tobytes())
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# A compiled bank records the hash of the source it came from; loading it
+# next to a different source fails instead of serving outdated questions.
+def check_source(meta, source_path):
+    if not os.path.exists(source_path) or 'source_sha256' not in meta:
+        return
+    if (os.path.getsize(source_path) != meta.get('source_size')
+            or file_sha256(source_path) != meta['source_sha256']):
+        raise QuestionBankError(
+            f"The compiled question bank is stale: {source_path} changed since it was "
+            f"compiled. Run: python question_bank.py compile {source_path}")
+
+
+# ---------- COMPILE ----------
+def compile_bank(source_path, data_path):
+    try:
+        with open(source_path, "r", encoding="utf-8") as f:
+            questions = json.load(f)
+    except ValueError as e:
+        raise QuestionBankError(f"{source_path} is not valid JSON: {e}") from e
+    clean, notes = validate_questions(questions)
+    meta = write_lazy_bank(clean, data_path, extra_meta={
+        'source': os.path.basename(source_path),
+        'source_size': os.path.getsize(source_path),
+        'source_sha256': file_sha256(source_path),
+    })
+    return meta, notes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="question_bank.py",
+                                     description="Validate and compile the SainsQuiz question bank")
+    commands = parser.add_subparsers(dest="command", required=True)
+    compile_cmd = commands.add_parser("compile", help="validate, deduplicate and write questions.jsonl + questions.idx")
+    compile_cmd.add_argument("source", nargs="?", default="questions.json")
+    compile_cmd.add_argument("-o", "--output", default=None)
+    check_cmd = commands.add_parser("check", help="validate without writing anything")
+    check_cmd.add_argument("source", nargs="?", default="questions.json")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "check":
+            with open(args.source, "r", encoding="utf-8") as f:
+                clean, notes = validate_questions(json.load(f))
+            for note in notes:
+                print(note)
+            print(f"OK: {len(clean)} questions")
+            return 0
+        output = args.output or os.path.splitext(args.source)[0] + ".jsonl"
+        meta, notes = compile_bank(args.source, output)
+    except (QuestionBankError, OSError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    for note in notes:
+        print(note)
+    print(f"Compiled {meta['count']} questions to {output} and {default_index_path(output)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,236 @@
+import sqlite3
+import struct
+import sys
+import threading
+import time
+import zlib
+from array import array
+
+import numpy as np
+
+UNANSWERED = 255
+
+
+class QuizStateError(ValueError):
+    pass
+
+
+# ---------- QUIZ STATE ----------
+# Everything a session needs to run one quiz, in a few dozen bytes: the
+# question ids (positions in the bank version the quiz was drawn from), the
+# option index chosen for each question (UNANSWERED until checked) and a
+# bitmap of which answers were right. Question text, options and
+# explanations stay in the shared bank; the score and the review list are
+# derived from the bitmap.
+#
+# index is the question on screen and submitted says it has been checked
+# and is waiting for "Next Question", so answered() == index + submitted.
+# A timed exam has a deadline (unix seconds, 0 for untimed quizzes) and is
+# answered all at once with submit(). dumps()/loads() turn the state into a
+# small checksummed blob (see the SNAPSHOTS section).
+class QuizState:
+    __slots__ = ('quiz_id', 'bank_version', 'player', 'subject', 'ids', 'chosen', 'correct',
+                 'index', 'submitted', 'deadline', 'late')
+
+    def __init__(self, quiz_id, bank_version, player, ids, subject="", deadline=0):
+        self.quiz_id = quiz_id
+        self.bank_version = bank_version
+        self.player = player
+        self.subject = subject
+        self.ids = array('I', ids)
+        self.chosen = bytearray([UNANSWERED]) * len(self.ids)
+        self.correct = bytearray((len(self.ids) + 7) // 8)
+        self.index = 0
+        self.submitted = False
+        self.deadline = int(deadline)
+        self.late = False
+
+    @property
+    def total(self):
+        return len(self.ids)
+
+    @property
+    def finished(self):
+        return self.index >= len(self.ids)
+
+    @property
+    def current(self):
+        return self.ids[self.index]
+
+    @property
+    def timed(self):
+        return self.deadline > 0
+
+    def remaining(self, now=None):
+        return self.deadline - (time.time() if now is None else now)
+
+    @property
+    def score(self):
+        return bin(int.from_bytes(self.correct, "little")).count("1")
+
+    def answered(self):
+        return self.index + self.submitted
+
+    def is_correct(self, i):
+        return bool(self.correct[i >> 3] & (1 << (i & 7)))
+
+    # Records the checked answer to the current question
+    def answer(self, option, is_correct):
+        if self.submitted or self.finished:
+            raise QuizStateError("The current question has already been answered")
+        i = self.index
+        self.chosen[i] = option
+        if is_correct:
+            self.correct[i >> 3] |= 1 << (i & 7)
+        self.submitted = True
+
+    def advance(self):
+        self.index += 1
+        self.submitted = False
+
+    # Grades every question at once: chosen holds an option index per
+    # question (UNANSWERED for blanks) and answer_key the correct ones.
+    # Returns the per-question result as a boolean array.
+    def submit(self, chosen, answer_key, late=False):
+        if self.finished:
+            raise QuizStateError("The quiz has already been submitted")
+        chosen = np.asarray(chosen, dtype=np.uint8)
+        answer_key = np.asarray(answer_key, dtype=np.uint8)
+        if len(chosen) != len(self.ids) or len(answer_key) != len(self.ids):
+            raise QuizStateError("Expected one answer per question")
+        right = chosen == answer_key
+        self.chosen = bytearray(chosen.tobytes())
+        self.correct = bytearray(np.packbits(right, bitorder="little").tobytes())
+        self.index, self.submitted, self.late = len(self.ids), False, late
+        return right
+
+    # (position, question id, chosen option, correct) of every checked answer
+    def answers(self):
+        return [(i, self.ids[i], self.chosen[i], self.is_correct(i)) for i in range(self.answered())]
+
+    # ---------- SERIALIZATION ----------
+    # Layout (little-endian): u8 format | u8 flags (bit 0: submitted, bit 1:
+    # late) | u16 index | u16 count | u32 deadline | four u8-length-prefixed
+    # UTF-8 strings (quiz_id, bank_version, player, subject) |
+    # u32 ids[count] | u8 chosen[count] | correct bitmap | u32 crc32 of
+    # everything before it. Format 1 had no deadline.
+    FORMAT = 2
+    HEADERS = {1: "<BBHH", 2: "<BBHHI"}
+
+    def dumps(self):
+        ids = self.ids
+        if sys.byteorder == "big":
+            ids = array('I', ids)
+            ids.byteswap()
+        flags = int(self.submitted) | int(self.late) << 1
+        parts = [struct.pack(self.HEADERS[self.FORMAT], self.FORMAT, flags, self.index, len(self.ids),
+                             self.deadline)]
+        for text in (self.quiz_id, self.bank_version, self.player, self.subject):
+            data = (text or "").encode("utf-8")
+            if len(data) > 255:
+                raise QuizStateError("Quiz state field is too long to serialize")
+            parts += [bytes([len(data)]), data]
+        parts += [ids.tobytes(), bytes(self.chosen), bytes(self.correct)]
+        body = b"".join(parts)
+        return body + struct.pack("<I", zlib.crc32(body))
+
+    @classmethod
+    def loads(cls, data):
+        try:
+            body, (crc,) = data[:-4], struct.unpack("<I", data[-4:])
+            if zlib.crc32(body) != crc:
+                raise QuizStateError("Quiz state checksum does not match")
+            header = cls.HEADERS.get(body[0])
+            if header is None:
+                raise QuizStateError(f"Unknown quiz state format {body[0]}")
+            fmt, flags, index, count, *rest = struct.unpack_from(header, body)
+            deadline = rest[0] if rest else 0
+            pos = struct.calcsize(header)
+            texts = []
+            for _ in range(4):
+                size = body[pos]
+                texts.append(body[pos + 1:pos + 1 + size].decode("utf-8"))
+                pos += 1 + size
+            ids = array('I')
+            ids.frombytes(body[pos:pos + 4 * count])
+            pos += 4 * count
+            if sys.byteorder == "big":
+                ids.byteswap()
+            chosen = bytearray(body[pos:pos + count])
+            correct = bytearray(body[pos + count:])
+        except (struct.error, IndexError, UnicodeDecodeError) as e:
+            raise QuizStateError(f"Quiz state is corrupt: {e}") from e
+        if len(ids) != count or len(chosen) != count or len(correct) != (count + 7) // 8 or index > count:
+            raise QuizStateError("Quiz state is truncated")
+
+        quiz_id, bank_version, player, subject = texts
+        state = cls(quiz_id, bank_version, player, ids, subject, deadline)
+        state.chosen, state.correct = chosen, correct
+        state.index, state.submitted, state.late = index, bool(flags & 1), bool(flags & 2)
+        return state
+
+
+# ---------- SNAPSHOTS ----------
+# Quiz states saved in a SQLite file on local disk, keyed by quiz id, so a
+# quiz survives a websocket reconnect (which starts a new session) or a
+# server restart: the page URL carries only the quiz id, and every worker
+# process on the host reads the same file. The score never leaves the
+# server, so a student cannot edit it. Snapshots not written for max_age
+# seconds are pruned.
+class SnapshotStore:
+    def __init__(self, path="quiz_snapshots.db", max_age=24 * 3600, prune_every=500):
+        self.path = path
+        self.max_age = max_age
+        self.prune_every = prune_every
+        self._lock = threading.Lock()
+        self._saves = 0
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS snapshots (
+                    quiz_id TEXT PRIMARY KEY,
+                    state BLOB NOT NULL,
+                    updated REAL NOT NULL
+                )
+            """)
+        self.prune()
+
+    def save(self, state):
+        data = state.dumps()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO snapshots (quiz_id, state, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT (quiz_id) DO UPDATE SET state = excluded.state, updated = excluded.updated",
+                (state.quiz_id, data, time.time()))
+            self._saves += 1
+        if self._saves % self.prune_every == 0:
+            self.prune()
+        return len(data)
+
+    # None when there is no usable snapshot under quiz_id
+    def load(self, quiz_id):
+        with self._lock:
+            row = self._conn.execute("SELECT state FROM snapshots WHERE quiz_id = ?",
+                                     (quiz_id,)).fetchone()
+        if row is None:
+            return None
+        try:
+            return QuizState.loads(bytes(row[0]))
+        except QuizStateError:
+            self.delete(quiz_id)
+            return None
+
+    def delete(self, quiz_id):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM snapshots WHERE quiz_id = ?", (quiz_id,))
+
+    def prune(self):
+        with self._lock, self._conn:
+            return self._conn.execute("DELETE FROM snapshots WHERE updated < ?",
+                                      (time.time() - self.max_age,)).rowcount
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM snapshots").fetchone()[0]
@@ -0,0 +1,52 @@
+import json
+import sqlite3
+import threading
+import time
+
+
+# ---------- SHARED STATE ----------
+# A small key-value table in a SQLite file that every worker process on the
+# host opens, for values all of them must agree on (the current question
+# bank version). changed() is cheap enough to call on every rerun: it reads
+# PRAGMA data_version, which only moves when another connection commits to
+# the file, so the table itself is only read after some other process wrote.
+class SharedState:
+    def __init__(self, path="shared_state.db"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._seen = None
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS kv (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    updated REAL NOT NULL
+                )
+            """)
+
+    def get(self, key, default=None):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM kv WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set(self, key, value):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO kv (key, value, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET value = excluded.value, updated = excluded.updated",
+                (key, json.dumps(value), time.time()))
+
+    def data_version(self):
+        with self._lock:
+            return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    # True when another process has written since the previous call (and on
+    # the first call). Writes through this object do not count.
+    def changed(self):
+        version = self.data_version()
+        with self._lock:
+            changed, self._seen = version != self._seen, version
+        return changed
@@ -0,0 +1,223 @@
+import random
+import threading
+import time
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(ConnectionError):
+    pass
+
+
+# gspread's APIError (and requests' HTTPError) carry the HTTP response; None
+# for anything Sheets did not answer
+def http_status(exc):
+    return getattr(getattr(exc, "response", None), "status_code", None)
+
+
+def is_retryable(exc):
+    status = http_status(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    return isinstance(exc, (ConnectionError, TimeoutError, OSError))
+
+
+# ---------- CIRCUIT BREAKER ----------
+# Opens after `threshold` consecutive failures and fails calls fast for
+# `reset_timeout` seconds. Then one trial call is let through (half open):
+# success closes the circuit, failure opens it again.
+class CircuitBreaker:
+    def __init__(self, threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self.trips = 0
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if self.clock() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or (self.opened_at is None and self.failures >= self.threshold):
+                if self.opened_at is None:
+                    self.trips += 1
+                self.opened_at = self.clock()
+            self._trial = False
+
+
+# ---------- MANAGED SHEET ----------
+# Stands in for a gspread worksheet (the calls SheetsBackend makes) and owns
+# the connection behind it. connect() builds a fresh worksheet (authorize +
+# open); nothing is cached until it succeeds, so a failure at startup is
+# retried on the next call instead of disabling the leaderboard until a
+# restart. The connection is rebuilt every `refresh_interval` seconds,
+# before the service account's one-hour access token runs out, and after
+# any connection-level error.
+#
+# Every call goes through the circuit breaker. Reads are retried up to
+# `max_retries` times with jittered exponential backoff when the error is
+# transient (timeouts, 429s, 5xx). Appends are not: a timed-out append may
+# have landed, and the score journal already resends them, skipping rows
+# whose key is stored.
+# `prepare(sheet)` runs once per process after the first successful connect
+# (the header check).
+class ManagedSheet:
+    def __init__(self, connect, prepare=None, max_retries=3, backoff=0.5, refresh_interval=45 * 60,
+                 breaker=None, clock=time.monotonic, sleep=time.sleep):
+        self._connect = connect
+        self._prepare = prepare
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.refresh_interval = refresh_interval
+        self.breaker = breaker or CircuitBreaker(clock=clock)
+        self.clock = clock
+        self.sleep = sleep
+
+        self._sheet = None
+        self._connected_at = None
+        self._prepared = False
+        self._lock = threading.Lock()
+        self._probe_thread = None
+
+        self.connects = 0
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.last_error = None
+        self.last_success = None
+
+    def _worksheet(self):
+        with self._lock:
+            stale = (self._connected_at is not None
+                     and self.clock() - self._connected_at >= self.refresh_interval)
+            if self._sheet is None or stale:
+                sheet = self._connect()
+                if not self._prepared and self._prepare is not None:
+                    self._prepare(sheet)
+                self._prepared = True
+                self._sheet, self._connected_at = sheet, self.clock()
+                self.connects += 1
+            return self._sheet
+
+    def _drop(self):
+        with self._lock:
+            self._sheet = self._connected_at = None
+
+    def call(self, method, *args, retries=None, **kwargs):
+        retries = self.max_retries if retries is None else retries
+        self.calls += 1
+        for attempt in range(retries + 1):
+            if not self.breaker.allow():
+                raise CircuitOpenError(f"Google Sheets circuit open after {self.breaker.failures} failures")
+            connected = False
+            try:
+                sheet = self._worksheet()
+                connected = True
+                result = getattr(sheet, method)(*args, **kwargs)
+            except Exception as e:
+                self.failures += 1
+                self.last_error = f"{type(e).__name__}: {e}"
+                if not is_retryable(e):
+                    # A bad request is not an outage: Sheets answered with an
+                    # HTTP status, which also settles a half-open trial.
+                    # Failing to connect at all (bad credentials, missing
+                    # sheet) or an error raised before any answer (e.g. bad
+                    # arguments) says nothing about Sheets being up.
+                    if connected and http_status(e) is not None:
+                        self.breaker.success()
+                    else:
+                        self.breaker.failure()
+                    raise
+                self.breaker.failure()
+                self._drop()
+                if attempt == retries:
+                    raise
+                self.retries += 1
+                delay = self.backoff * (2 ** attempt)
+                self.sleep(delay + random.uniform(0, delay))
+                continue
+            self.breaker.success()
+            self.last_success = self.clock()
+            return result
+
+    # A cheap read through the normal call path
+    def probe(self):
+        try:
+            self.call("row_values", 1)
+            return True
+        except Exception:
+            return False
+
+    # While the circuit is open, probe every `interval` seconds so it closes
+    # as soon as Sheets is back even if no session is making calls
+    def start_probe(self, interval=30.0):
+        def run():
+            while True:
+                time.sleep(interval)
+                if self.breaker.state != "closed":
+                    self.probe()
+
+        if self._probe_thread is None:
+            self._probe_thread = threading.Thread(target=run, name="sheets-probe", daemon=True)
+            self._probe_thread.start()
+
+    def health(self):
+        return {
+            'state': self.breaker.state,
+            'connected': self._sheet is not None,
+            'connects': self.connects,
+            'calls': self.calls,
+            'retries': self.retries,
+            'failures': self.failures,
+            'breaker_trips': self.breaker.trips,
+            'seconds_since_success': (self.clock() - self.last_success) if self.last_success else None,
+            'last_error': self.last_error,
+        }
+
+    def batch_get(self, ranges):
+        return self.call("batch_get", ranges)
+
+    def get_values(self, *args, **kwargs):
+        return self.call("get_values", *args, **kwargs)
+
+    def row_values(self, row):
+        return self.call("row_values", row)
+
+    def append_row(self, values):
+        return self.call("append_row", values, retries=0)
+
+    # Overwriting fixed cells is idempotent, so it is retried like a read
+    def update(self, range_name, values):
+        return self.call("update", range_name=range_name, values=values)
+
+    def append_rows(self, rows):
+        return self.call("append_rows", rows, retries=0)
+
+    def clear(self):
+        return self.call("clear", retries=0)
@@ -0,0 +1,119 @@
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+PERCENTILES = (10, 25, 50, 75, 90)
+
+
+# ---------- LOADING ----------
+# One row per answer from analytics.db (see analytics.py), with compact
+# dtypes: categoricals for the repeated strings, int8 for the flags.
+def load_answers(path="analytics.db", since=None):
+    sql = ("SELECT a.ts, a.player, a.quiz, a.question_key, q.subject, q.question, "
+           "a.chosen, a.correct FROM answers a JOIN question_stats q USING (question_key)")
+    params = ()
+    if since is not None:
+        sql += " WHERE a.ts >= ?"
+        params = (since,)
+    with sqlite3.connect(path) as conn:
+        answers = pd.read_sql_query(sql, conn, params=params)
+    return prepare_answers(answers)
+
+
+def prepare_answers(answers):
+    answers = answers.copy()
+    answers['ts'] = pd.to_datetime(answers['ts'], unit='s')
+    for column in ('player', 'quiz', 'question_key', 'subject'):
+        answers[column] = answers[column].astype('category')
+    answers['chosen'] = answers['chosen'].astype('int8')
+    answers['correct'] = answers['correct'].astype('int8')
+    return answers
+
+
+# ---------- SCORES ----------
+# One row per quiz: when it finished, who took it, how many questions were
+# answered and how many were right. Answers without a quiz id are skipped.
+def quiz_scores(answers):
+    answers = answers[answers['quiz'].notna()]
+    scores = answers.groupby('quiz', observed=True).agg(
+        player=('player', 'first'), ts=('ts', 'max'),
+        questions=('correct', 'size'), correct=('correct', 'sum'))
+    scores['percentage'] = scores['correct'] / scores['questions'] * 100
+    return scores
+
+
+def score_distribution(scores, bins=10):
+    counts, edges = np.histogram(scores['percentage'].to_numpy(), bins=bins, range=(0, 100))
+    labels = [f"{lo:.0f}-{hi:.0f}%" for lo, hi in zip(edges[:-1], edges[1:])]
+    return pd.Series(counts, index=pd.Index(labels, name='score'), name='quizzes')
+
+
+# Percentiles of per-quiz accuracy within each subject
+def subject_percentiles(answers, percentiles=PERCENTILES):
+    answers = answers[answers['quiz'].notna()]
+    per_quiz = answers.groupby(['subject', 'quiz'], observed=True)['correct'].mean() * 100
+    if per_quiz.empty:
+        return pd.DataFrame(columns=[f"p{p}" for p in percentiles] + ['quizzes'],
+                            index=pd.Index([], name='subject'), dtype=float)
+    table = per_quiz.groupby(level='subject', observed=True).quantile(
+        [p / 100 for p in percentiles]).unstack()
+    table.columns = [f"p{p}" for p in percentiles]
+    table['quizzes'] = per_quiz.groupby(level='subject', observed=True).size()
+    return table
+
+
+# ---------- ITEM ANALYSIS ----------
+# Per question: difficulty (share answered correctly) and discrimination,
+# the point-biserial correlation between getting this item right and the
+# rest of the quiz (the quiz score without this item). Good items are
+# answered correctly more often by students who do well overall. The
+# correlation is computed from grouped sums, so it is one pass over the
+# answers with no per-question Python loop.
+def item_analysis(answers, min_attempts=20):
+    answers = answers[answers['quiz'].notna()]
+    quiz = answers.groupby('quiz', observed=True)['correct']
+    size = quiz.transform('size').to_numpy(dtype=float)
+    x = answers['correct'].to_numpy(dtype=float)
+    rest = np.divide(quiz.transform('sum').to_numpy(dtype=float) - x, size - 1,
+                     out=np.full_like(x, np.nan), where=size > 1)
+    frame = pd.DataFrame({'question_key': answers['question_key'], 'x': x, 'y': rest})
+    frame = frame[~np.isnan(rest)]
+    frame['xy'], frame['xx'], frame['yy'] = frame['x'] * frame['y'], frame['x'] ** 2, frame['y'] ** 2
+    sums = frame.groupby('question_key', observed=True).agg(
+        n=('x', 'size'), x=('x', 'sum'), y=('y', 'sum'), xy=('xy', 'sum'), xx=('xx', 'sum'), yy=('yy', 'sum'))
+    n = sums['n']
+    cov = sums['xy'] - sums['x'] * sums['y'] / n
+    var = (sums['xx'] - sums['x'] ** 2 / n) * (sums['yy'] - sums['y'] ** 2 / n)
+    discrimination = cov / np.sqrt(var.where(var > 0))
+
+    info = answers.groupby('question_key', observed=True).agg(
+        subject=('subject', 'first'), question=('question', 'first'), attempts=('correct', 'size'),
+        difficulty=('correct', 'mean'))
+    info['discrimination'] = discrimination
+    info = info[info['attempts'] >= min_attempts]
+    return info.sort_values(['discrimination', 'difficulty'], na_position='first')
+
+
+# Share of answers picking each option, one row per question
+def option_rates(answers):
+    if answers.empty:
+        return pd.DataFrame(index=pd.Index([], name='question_key'))
+    picks = pd.crosstab(answers['question_key'], answers['chosen'], normalize='index')
+    picks.columns = [f"option {int(c) + 1}" if c >= 0 else "other" for c in picks.columns]
+    return picks
+
+
+# ---------- TRENDS ----------
+# Accuracy over the trailing `days` days, sampled daily, per subject. Daily
+# sums are rolled rather than individual answers.
+def rolling_accuracy(answers, days=7):
+    if answers.empty:
+        return pd.DataFrame(index=pd.DatetimeIndex([], name='ts'),
+                            columns=pd.CategoricalIndex([], name='subject'), dtype=float)
+    daily = answers.groupby(['subject', pd.Grouper(key='ts', freq='D')], observed=True)['correct'].agg(
+        ['sum', 'count'])
+    daily = daily.unstack('subject', fill_value=0).asfreq('D', fill_value=0)
+    rolled = daily.rolling(days, min_periods=1).sum()
+    accuracy = rolled['sum'] / rolled['count'].where(rolled['count'] > 0)
+    return accuracy * 100
@@ -0,0 +1,311 @@
+import re
+import sqlite3
+import threading
+import time
+
+from sheets_client import ManagedSheet
+
+# Subject is empty for mixed-subject quizzes; Total is the number of
+# questions; Key is a unique id per saved score, so a row sent twice (see
+# journal.py) can be recognised. Rows written before these columns existed
+# just leave them empty.
+HEADER = ['Name', 'Score', 'Date', 'Subject', 'Total', 'Key']
+KEY = HEADER.index('Key')
+
+
+def pad_row(row):
+    row = list(row[:len(HEADER)])
+    return row + [""] * (len(HEADER) - len(row))
+
+
+# ---------- BACKEND INTERFACE ----------
+# Every backend stores leaderboard rows in append order. read_from(cursor)
+# returns (header, [(cursor, values), ...]) for the row at `cursor` and all
+# rows after it, or every row when cursor is None. Cursors are opaque to
+# callers: a sheet row number, a SQLite rowid or a list index.
+class LeaderboardBackend:
+    name = "base"
+
+    def append_rows(self, rows):
+        raise NotImplementedError
+
+    def read_from(self, cursor=None):
+        raise NotImplementedError
+
+    # Used for full rescans. Backends that can answer top-N from an index
+    # override this to return only the rows that can appear in a view (the
+    # top `size` per subject overall and since each date in `since`) plus
+    # the newest row.
+    def scan(self, size, since=()):
+        return self.read_from(None)
+
+    # Appends only the rows whose key is not stored yet, for rows that may
+    # have been sent before. Backends that ignore duplicate keys on every
+    # append override this with append_rows.
+    def append_new(self, rows):
+        rows = [pad_row(r) for r in rows]
+        stored = self.stored_keys({r[KEY] for r in rows if r[KEY]})
+        rows = [r for r in rows if not r[KEY] or r[KEY] not in stored]
+        if rows:
+            self.append_rows(rows)
+
+    def stored_keys(self, keys):
+        raise NotImplementedError
+
+    # A value that changes whenever any process may have written rows, or
+    # None when the backend cannot tell (callers then poll on a timer)
+    def data_version(self):
+        return None
+
+
+# ---------- GOOGLE SHEETS ----------
+class SheetsBackend(LeaderboardBackend):
+    name = "sheets"
+
+    def __init__(self, sheet):
+        self.sheet = sheet
+
+    def append_rows(self, rows):
+        self.sheet.append_rows([pad_row(r) for r in rows])
+
+    def read_from(self, cursor=None):
+        start = cursor or 2
+        header, rows = self.sheet.batch_get(["1:1", f"A{start}:ZZ"])
+        header = list(header[0]) if header else []
+        return header, [(start + i, list(r)) for i, r in enumerate(rows)]
+
+    # Reads the whole Key column; only needed after a write whose outcome is
+    # unknown, so it is not on the normal save path
+    def stored_keys(self, keys):
+        if not keys:
+            return set()
+        column = chr(ord('A') + KEY)
+        (values,) = self.sheet.batch_get([f"{column}2:{column}"])
+        return keys & {r[0] for r in values if r}
+
+
+# ---------- SQLITE ----------
+# WAL mode lets readers in other sessions (or processes) keep reading while
+# the write-behind worker appends. The score index serves full rescans, and
+# a unique index on key makes appending the same row twice a no-op.
+# Several worker processes on one host can share the file: data_version()
+# reads PRAGMA data_version on a connection of its own, so it moves on every
+# commit by any other connection, including this process's writer thread.
+class SQLiteBackend(LeaderboardBackend):
+    name = "sqlite"
+
+    def __init__(self, path="leaderboard.db"):
+        self.path = path
+        self._local = threading.local()
+        self._watch = None
+        self._watch_lock = threading.Lock()
+        conn = self._conn()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS scores (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                score INTEGER NOT NULL,
+                date TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_scores_score ON scores (score DESC, id);
+        """)
+        # Databases created before scores carried a subject and question count
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(scores)")]
+        with conn:
+            if 'subject' not in columns:
+                conn.execute("ALTER TABLE scores ADD COLUMN subject TEXT NOT NULL DEFAULT ''")
+            if 'total' not in columns:
+                conn.execute("ALTER TABLE scores ADD COLUMN total INTEGER")
+            if 'key' not in columns:
+                conn.execute("ALTER TABLE scores ADD COLUMN key TEXT")
+            conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_scores_key ON scores (key) "
+                         "WHERE key IS NOT NULL")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_scores_subject_score "
+                         "ON scores (subject, score DESC, id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_scores_date ON scores (date)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def append_rows(self, rows):
+        conn = self._conn()
+        with conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO scores (name, score, date, subject, total, key) VALUES (?, ?, ?, ?, ?, ?)",
+                [(r[0], r[1], r[2], r[3] or "", r[4] or None, r[5] or None) for r in map(pad_row, rows)])
+
+    append_new = append_rows
+
+    def read_from(self, cursor=None):
+        cur = self._conn().execute(
+            "SELECT id, name, score, date, subject, total, key FROM scores WHERE id >= ? ORDER BY id",
+            (cursor or 0,))
+        return list(HEADER), [(row[0], self._values(row)) for row in cur]
+
+    # Every overall top-N row is also in its subject's top N, so the top N
+    # of each subject (one index range each) covers every view
+    def scan(self, size, since=()):
+        conn = self._conn()
+        columns = "SELECT id, name, score, date, subject, total, key FROM scores"
+        subjects = [row[0] for row in conn.execute("SELECT DISTINCT subject FROM scores")]
+        rows = set()
+        for subject in subjects:
+            rows.update(conn.execute(
+                f"{columns} WHERE subject = ? AND score > 0 ORDER BY score DESC, id LIMIT ?",
+                (subject, size)))
+            for start in since:
+                rows.update(conn.execute(
+                    f"{columns} WHERE subject = ? AND date >= ? AND score > 0 "
+                    "ORDER BY score DESC, id LIMIT ?", (subject, start, size)))
+        newest = conn.execute(f"{columns} ORDER BY id DESC LIMIT 1").fetchone()
+        if newest:
+            rows.add(newest)
+        return list(HEADER), [(row[0], self._values(row)) for row in sorted(rows)]
+
+    def _values(self, row):
+        return [row[1], str(row[2]), row[3], row[4] or "", "" if row[5] is None else str(row[5]), row[6] or ""]
+
+    def data_version(self):
+        with self._watch_lock:
+            if self._watch is None:
+                self._watch = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            return self._watch.execute("PRAGMA data_version").fetchone()[0]
+
+
+# ---------- IN-MEMORY ----------
+# Process-wide and lost on restart; meant for local runs, tests and benchmarks.
+# Like SQLite it skips rows whose key is already stored.
+class MemoryBackend(LeaderboardBackend):
+    name = "memory"
+
+    def __init__(self):
+        self._rows = []
+        self._keys = set()
+        self._lock = threading.Lock()
+
+    def append_rows(self, rows):
+        with self._lock:
+            for r in rows:
+                r = [str(v) for v in pad_row(r)]
+                if r[KEY] and r[KEY] in self._keys:
+                    continue
+                if r[KEY]:
+                    self._keys.add(r[KEY])
+                self._rows.append(r)
+
+    append_new = append_rows
+
+    def read_from(self, cursor=None):
+        start = cursor or 0
+        with self._lock:
+            rows = self._rows[start:]
+        return list(HEADER), [(start + i, list(r)) for i, r in enumerate(rows)]
+
+
+# "A" -> 0, "Z" -> 25, "AA" -> 26
+def _column_index(letters):
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - ord('A') + 1
+    return index - 1
+
+
+# ---------- FAKE SHEET ----------
+# Stands in for a gspread worksheet (the calls SheetsBackend makes) with a
+# configurable per-call latency, so the Sheets code path can be exercised
+# and benchmarked without Google. fail(n) makes the next n calls raise, to
+# exercise retries and the circuit breaker in ManagedSheet.
+class FakeSheet:
+    def __init__(self, latency=0.0, rows=None):
+        self.latency = latency
+        self.calls = 0
+        self._failures = []
+        self._rows = [list(HEADER)] + [list(r) for r in rows or []]
+        self._lock = threading.Lock()
+
+    def fail(self, times=1, error=None):
+        with self._lock:
+            self._failures.extend([error or ConnectionError("Simulated Sheets outage")] * times)
+
+    def _call(self):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            error = self._failures.pop(0) if self._failures else None
+        if error is not None:
+            raise error
+
+    def _range(self, a1):
+        match = re.fullmatch(r"(\d+):(\d+)", a1)
+        if match:
+            first, last = int(match.group(1)), int(match.group(2))
+            return [list(r) for r in self._rows[first - 1:last]]
+        match = re.fullmatch(r"([A-Z]+)(\d+)(?::([A-Z]+)(\d*))?", a1)
+        if not match:
+            raise ValueError(f"Unsupported range: {a1}")
+        first_col = _column_index(match.group(1))
+        last_col = _column_index(match.group(3) or match.group(1))
+        first = int(match.group(2))
+        last = int(match.group(4)) if match.group(4) else len(self._rows)
+        return [list(r[first_col:last_col + 1]) for r in self._rows[first - 1:last]]
+
+    def batch_get(self, ranges):
+        self._call()
+        with self._lock:
+            return [self._range(r) for r in ranges]
+
+    def get_values(self, a1="A1:ZZ"):
+        self._call()
+        with self._lock:
+            return self._range(a1)
+
+    def row_values(self, row):
+        self._call()
+        with self._lock:
+            return list(self._rows[row - 1]) if row <= len(self._rows) else []
+
+    def append_row(self, values):
+        self.append_rows([values])
+
+    # Only whole-row ranges like "A1" or "A1:E1", which is all the app writes
+    def update(self, range_name, values):
+        self._call()
+        match = re.fullmatch(r"A(\d+)(?::[A-Z]+\d+)?", range_name)
+        if not match:
+            raise ValueError(f"Unsupported range: {range_name}")
+        with self._lock:
+            first = int(match.group(1)) - 1
+            while len(self._rows) < first + len(values):
+                self._rows.append([])
+            for i, row in enumerate(values):
+                self._rows[first + i] = [str(v) for v in row]
+
+    def append_rows(self, rows):
+        self._call()
+        with self._lock:
+            self._rows.extend([str(v) for v in r] for r in rows)
+
+    def clear(self):
+        self._call()
+        with self._lock:
+            self._rows = []
+
+
+def create_backend(kind, sheet=None, path=None, latency=0.0):
+    if kind == "sheets":
+        return SheetsBackend(sheet) if sheet is not None else None
+    if kind == "fake_sheets":
+        fake = FakeSheet(latency=float(latency or 0))
+        return SheetsBackend(ManagedSheet(lambda: fake))
+    if kind == "sqlite":
+        return SQLiteBackend(path or "leaderboard.db")
+    if kind == "memory":
+        return MemoryBackend()
+    raise ValueError(f"Unknown leaderboard backend: {kind}")
@@ -0,0 +1,92 @@
+import os
+import time
+
+import streamlit as st
+
+from stats import (item_analysis, load_answers, option_rates, quiz_scores, rolling_accuracy,
+                   score_distribution, subject_percentiles)
+
+# ---------- PAGE CONFIG ----------
+# Run with: streamlit run teacher_report.py
+st.set_page_config(page_title="SainsQuiz - Teacher Report", page_icon="📈", layout="wide")
+
+ANALYTICS_DB = os.environ.get("SAINSQUIZ_ANALYTICS_DB", "analytics.db")
+
+# ---------- DATA ----------
+# Loaded once a minute; every report below is computed from these frames
+@st.cache_data(ttl=60, show_spinner="Loading answers...")
+def get_answers(days):
+    since = time.time() - days * 86400 if days else None
+    return load_answers(ANALYTICS_DB, since=since)
+
+@st.cache_data(ttl=60)
+def get_reports(days, subject):
+    answers = get_answers(days)
+    if subject != "All":
+        answers = answers[answers['subject'] == subject]
+    scores = quiz_scores(answers)
+    if scores.empty:
+        # A quiet period; the page stops at the "No quizzes" notice
+        return {'answers': len(answers), 'scores': scores}
+    return {
+        'answers': len(answers),
+        'scores': scores,
+        'distribution': score_distribution(scores),
+        'percentiles': subject_percentiles(answers),
+        'items': item_analysis(answers, min_attempts=1),
+        'options': option_rates(answers),
+        'trend': rolling_accuracy(answers),
+    }
+
+st.title("📈 Teacher Report")
+
+if not os.path.exists(ANALYTICS_DB):
+    st.info("No answers recorded yet. Answers are saved to analytics.db while students play.")
+    st.stop()
+
+with st.sidebar:
+    periods = {"Last 7 days": 7, "Last 30 days": 30, "Last 90 days": 90, "All time": 0}
+    days = periods[st.selectbox("Period", list(periods), index=1)]
+    subjects = ["All"] + sorted(get_answers(days)['subject'].dropna().unique().tolist())
+    subject = st.selectbox("Subject", subjects)
+    min_attempts = st.slider("Minimum answers per question", 1, 200, 20)
+
+reports = get_reports(days, subject)
+scores = reports['scores']
+if scores.empty:
+    st.info("No quizzes in this period.")
+    st.stop()
+
+# ---------- OVERVIEW ----------
+col1, col2, col3, col4 = st.columns(4)
+col1.metric("Quizzes", f"{len(scores):,}")
+col2.metric("Students", f"{scores['player'].nunique():,}")
+col3.metric("Answers", f"{reports['answers']:,}")
+col4.metric("Median score", f"{scores['percentage'].median():.0f}%")
+
+col1, col2 = st.columns(2)
+with col1:
+    st.subheader("Score distribution")
+    st.bar_chart(reports['distribution'])
+with col2:
+    st.subheader("Accuracy, trailing 7 days")
+    st.line_chart(reports['trend'])
+
+st.subheader("Score percentiles by subject")
+st.dataframe(reports['percentiles'].style.format("{:.0f}"), use_container_width=True)
+
+# ---------- ITEM ANALYSIS ----------
+st.subheader("Questions")
+st.caption("Difficulty is the share of students answering correctly. Discrimination below 0.2 "
+           "means strong and weak students do about equally well on the question; check its "
+           "wording and answer key.")
+items = reports['items']
+items = items[items['attempts'] >= min_attempts]
+st.dataframe(items.reset_index(drop=True).style.format({'difficulty': "{:.0%}", 'discrimination': "{:.2f}"}),
+             use_container_width=True, hide_index=True)
+
+if not items.empty:
+    question = st.selectbox("Option choices for", items['question'].tolist())
+    key = items.index[items['question'] == question][0]
+    if key in reports['options'].index:
+        st.bar_chart(reports['options'].loc[key].rename("share of answers"))
@@ -0,0 +1,79 @@
+from array import array
+
+from adaptive import INTERVALS, AdaptiveSelector, PlayerHistory
+from question_bank import QuestionBank
+
+KEY = ("Physics", None, None)
+
+
+def bank(n=50):
+    return QuestionBank([{"subject": "Physics", "question": f"Question {i}?", "options": ["A", "B"],
+                          "correct_option": 0, "explanation": "Because."} for i in range(n)])
+
+
+def test_unseen_skips_answered_questions_without_repeats():
+    questions = bank(100)
+    pool = questions.ids("Physics")
+    history = PlayerHistory("v1")
+    for qid in range(95):
+        history.record(questions[qid], True, now=0)
+    for _ in range(20):
+        picked = history.unseen(pool, KEY, 3)
+        assert len(set(picked)) == 3 and min(picked) >= 95
+    assert sorted(history.unseen(pool, KEY, 10)) == [95, 96, 97, 98, 99]
+
+    history.record(questions[97], False, now=0)
+    assert sorted(history.unseen(pool, KEY, 10)) == [95, 96, 98, 99]
+    # Answered questions have dropped out of the shuffle for good
+    assert history.shuffles[KEY][0] == 4
+
+
+def test_unseen_covers_the_pool_once_everything_is_answered():
+    questions = bank(30)
+    pool = questions.ids("Physics")
+    history = PlayerHistory("v1")
+    drawn = []
+    while True:
+        picked = history.unseen(pool, KEY, 4)
+        if not picked:
+            break
+        drawn += picked
+        for qid in picked:
+            history.record(questions[qid], True, now=0)
+    assert sorted(drawn) == list(range(30))
+
+
+def test_unseen_with_a_filtered_pool():
+    pool = array('I', [4, 9, 16, 25])
+    questions = bank(30)
+    history = PlayerHistory("v1")
+    history.record(questions[9], True, now=0)
+    assert sorted(history.unseen(pool, KEY, 10)) == [4, 16, 25]
+
+
+def test_wrong_answers_come_back_first():
+    now = [1000.0]
+    selector = AdaptiveSelector(new_share=0.5, clock=lambda: now[0])
+    questions = bank()
+    for qid in range(10):
+        selector.record("ali", "v1", questions[qid], correct=qid != 3)
+    now[0] += 1
+    quiz = selector.select("ali", "v1", questions, 4, subject="Physics")
+    assert 3 in quiz and len(set(quiz)) == 4
+    # The rest are new questions: the right answers are not due yet
+    assert not set(quiz) & (set(range(10)) - {3})
+
+    now[0] += INTERVALS[1]
+    due = selector.select("ali", "v1", questions, 10, subject="Physics")
+    assert len(set(due) & set(range(10))) == 5
+
+
+def test_rename_merges_histories():
+    selector = AdaptiveSelector()
+    questions = bank()
+    selector.record("session-1", "v1", questions[1], correct=False)
+    selector.record("Ali", "v1", questions[2], correct=True)
+    selector.rename("session-1", "Ali")
+    assert len(selector) == 1
+    history = selector._players["Ali"]
+    assert set(history.cards) == {1, 2}
@@ -0,0 +1,27 @@
+import os
+
+import background
+
+
+def test_owner_alive_follows_the_lock(tmp_path):
+    base = str(tmp_path / "pending.jsonl")
+    assert not background.owner_alive(base, 999991)
+
+    fd = os.open(f"{base}.999991.lock", os.O_RDWR | os.O_CREAT)
+    assert background._lock(fd, block=False)
+    assert background.owner_alive(base, 999991)
+
+    # The lock is released when its owner exits; its file is cleaned up
+    os.close(fd)
+    assert not background.owner_alive(base, 999991)
+    assert not os.path.exists(f"{base}.999991.lock")
+
+
+def test_owner_lock_counts_itself_as_alive(tmp_path):
+    base = str(tmp_path / "pending.jsonl")
+    lock = background.OwnerLock(base)
+    assert lock.alive(os.getpid())
+    # Also seen from outside the OwnerLock, e.g. by import_spilled_scores
+    assert background.owner_alive(base, os.getpid())
+    lock.prune()
+    assert os.path.exists(lock.path)
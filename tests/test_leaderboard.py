@@ -0,0 +1,57 @@
+from datetime import datetime
+
+from leaderboard import IncrementalLeaderboard
+from storage import MemoryBackend
+
+NOW = datetime(2026, 10, 14, 12, 0)
+TODAY = "2026-10-14 11:00:00"
+
+
+def board(rows):
+    backend = MemoryBackend()
+    backend.append_rows(rows)
+    return backend, IncrementalLeaderboard(size=3, clock=lambda: NOW)
+
+
+def test_refresh_reads_only_new_rows():
+    backend, leaderboard = board([["Ali", "5", TODAY, "Physics", "10", "k1"]])
+    leaderboard.refresh(backend)
+    backend.append_rows([["Mei", "7", TODAY, "Physics", "10", "k2"]])
+    assert leaderboard.refresh(backend) == [("Mei", 7, False), ("Ali", 5, False)]
+    # Only the first refresh (no header yet) scans everything
+    assert leaderboard.full_scans == 1
+
+
+def test_pending_entry_settles_when_its_row_arrives():
+    backend, leaderboard = board([])
+    leaderboard.add_pending("Ali", 5, TODAY, "Physics")
+    assert leaderboard.top("Physics") == [("Ali", 5, True)]
+    backend.append_rows([["Ali", "5", TODAY, "Physics", "10", "k1"]])
+    leaderboard.refresh(backend)
+    assert leaderboard.top("Physics") == [("Ali", 5, False)]
+
+
+def test_rescan_with_pending_entries_changes_their_versions():
+    backend, leaderboard = board([["Ali", "5", TODAY, "Physics", "10", "k1"],
+                                  ["Mei", "7", TODAY, "Physics", "10", "k2"]])
+    leaderboard.refresh(backend)
+    leaderboard.add_pending("Tan", 4, TODAY, "Biology")
+    before, _ = leaderboard.snapshot("Biology")
+
+    # The backend shrank, so the next refresh rescans from scratch
+    backend._rows.pop()
+    leaderboard.refresh(backend)
+    assert leaderboard.full_scans == 2
+
+    pending_version, entries = leaderboard.snapshot("Biology")
+    empty_version, empty = leaderboard.snapshot("Chemistry")
+    assert entries == [("Tan", 4, True)] and empty == []
+    assert pending_version not in (before, empty_version)
+    assert leaderboard.top("Physics") == [("Ali", 5, False)]
+
+
+def test_pending_entries_skip_blank_names_and_zero_scores():
+    backend, leaderboard = board([])
+    leaderboard.add_pending("  ", 5, TODAY, "Physics")
+    leaderboard.add_pending("Ali", 0, TODAY, "Physics")
+    assert leaderboard.top() == []
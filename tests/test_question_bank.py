@@ -0,0 +1,112 @@
+import json
+import os
+import time
+
+import pytest
+
+import question_bank
+from question_bank import (BankReloader, LazyQuestionBank, QuestionBank, QuestionBankError,
+                           bank_fingerprint, compile_bank, main, validate_questions, write_lazy_bank)
+
+
+def question(i, subject="Physics", difficulty="easy"):
+    return {"subject": subject, "difficulty": difficulty, "question": f"Question {i}?",
+            "options": ["A", "B", "C", "D"], "correct_option": i % 4, "explanation": "Because."}
+
+
+QUESTIONS = [question(i) for i in range(6)] + [question(i, "Biology", "hard") for i in range(6, 10)]
+
+
+def test_lazy_bank_matches_the_in_memory_bank(tmp_path):
+    data_path = str(tmp_path / "questions.jsonl")
+    write_lazy_bank(QUESTIONS, data_path)
+    lazy, memory = LazyQuestionBank(data_path), QuestionBank(QUESTIONS)
+    assert len(lazy) == len(memory) == 10
+    assert lazy[7].question == memory[7].question == "Question 7?"
+    assert lazy[7].correct_answer == "D"
+    assert list(lazy.ids("Biology")) == list(memory.ids("Biology")) == [6, 7, 8, 9]
+    assert lazy.count(difficulty="easy") == 6
+    assert lazy.values("subject") == ["Biology", "Physics"]
+    assert set(lazy.sample_ids(3, subject="Physics")) <= set(range(6))
+    with pytest.raises(IndexError):
+        lazy[10]
+
+
+def test_recompiling_leaves_open_banks_readable(tmp_path):
+    data_path = str(tmp_path / "questions.jsonl")
+    write_lazy_bank(QUESTIONS, data_path)
+    old = LazyQuestionBank(data_path)
+    write_lazy_bank(QUESTIONS[:3], data_path)
+    assert old[9].subject == "Biology"
+    assert len(LazyQuestionBank(data_path)) == 3
+
+
+def test_data_size_mismatch_closes_the_data_file(tmp_path, monkeypatch):
+    data_path = str(tmp_path / "questions.jsonl")
+    write_lazy_bank(QUESTIONS, data_path)
+    with open(data_path, "ab") as f:
+        f.write(b"{}\n")
+    opened = []
+
+    def tracking_open(*args, **kwargs):
+        opened.append(open(*args, **kwargs))
+        return opened[-1]
+
+    monkeypatch.setattr(question_bank, "open", tracking_open, raising=False)
+    with pytest.raises(QuestionBankError):
+        LazyQuestionBank(data_path)
+    assert opened and all(f.closed for f in opened)
+
+
+def wait_for_reload(reloader):
+    for _ in range(500):
+        if not reloader._reloading:
+            return
+        time.sleep(0.01)
+    raise AssertionError("reload did not finish")
+
+
+def test_stale_compiled_bank_keeps_serving_and_reports_the_error(tmp_path):
+    source, data_path = tmp_path / "questions.json", str(tmp_path / "questions.jsonl")
+    source.write_text(json.dumps(QUESTIONS))
+    compile_bank(str(source), data_path)
+    reloader = BankReloader(lambda: LazyQuestionBank(data_path, source_path=str(source)),
+                            [str(source), data_path], check_interval=0)
+    version = reloader.version
+    assert version == bank_fingerprint(reloader.current)
+
+    # Edited without recompiling
+    source.write_text(json.dumps(QUESTIONS[:5]))
+    assert reloader.check(force=True)
+    wait_for_reload(reloader)
+    assert isinstance(reloader.last_error, QuestionBankError)
+    assert reloader.version == version and len(reloader.current) == 10
+
+    compile_bank(str(source), data_path)
+    assert reloader.check(force=True)
+    wait_for_reload(reloader)
+    assert reloader.last_error is None and len(reloader.current) == 5
+    assert reloader.get(version) is not None
+
+
+def test_validation_lists_every_problem():
+    bad = [question(0), {"subject": "Physics"}, dict(question(2), correct_option=9),
+           dict(question(3), options=["A", "A"])]
+    with pytest.raises(QuestionBankError) as e:
+        validate_questions(bad)
+    assert {error.split(":")[0] for error in e.value.errors} == {"question 1", "question 2", "question 3"}
+    assert "question 3: 'options' contains duplicates" in e.value.errors
+
+
+def test_compile_drops_duplicates_and_records_the_source(tmp_path):
+    source, data_path = tmp_path / "questions.json", str(tmp_path / "questions.jsonl")
+    duplicate = dict(question(1), question="  question 1? ")
+    source.write_text(json.dumps(QUESTIONS + [duplicate]))
+    meta, notes = compile_bank(str(source), data_path)
+    assert meta['count'] == 10
+    assert notes == ["question 10: duplicate of question 1, skipped"]
+    assert meta['source_size'] == source.stat().st_size
+
+    assert main(["compile", str(source)]) == 0
+    source.write_text("[")
+    assert main(["compile", str(source)]) == 1
@@ -0,0 +1,75 @@
+import pytest
+
+from quiz_state import UNANSWERED, QuizState, QuizStateError, SnapshotStore
+
+
+def quiz(**kwargs):
+    return QuizState("quiz-1", "abc123", "Ali", [7, 3, 42, 11], subject="Physics", **kwargs)
+
+
+def test_round_trip_mid_quiz():
+    state = quiz()
+    state.answer(2, True)
+    state.advance()
+    state.answer(0, False)
+    loaded = QuizState.loads(state.dumps())
+    assert (loaded.quiz_id, loaded.bank_version, loaded.player, loaded.subject) == \
+        ("quiz-1", "abc123", "Ali", "Physics")
+    assert list(loaded.ids) == [7, 3, 42, 11]
+    assert (loaded.index, loaded.submitted, loaded.score) == (1, True, 1)
+    assert loaded.answers() == [(0, 7, 2, True), (1, 3, 0, False)]
+    assert not loaded.timed
+
+
+def test_round_trip_late_exam():
+    state = quiz(deadline=1_800_000_000)
+    state.submit([1, 0, UNANSWERED, 2], [1, 1, 0, 2], late=True)
+    loaded = QuizState.loads(state.dumps())
+    assert (loaded.deadline, loaded.late, loaded.finished, loaded.score) == (1_800_000_000, True, True, 2)
+    assert loaded.chosen == state.chosen
+
+
+@pytest.mark.parametrize("damage", [
+    lambda data: data[:-1],
+    lambda data: data[:10],
+    lambda data: b"",
+    lambda data: data[:5] + bytes([data[5] ^ 1]) + data[6:],
+])
+def test_rejects_corrupt_snapshots(damage):
+    data = quiz().dumps()
+    with pytest.raises(QuizStateError):
+        QuizState.loads(damage(data))
+
+
+def test_submit_grades_every_question():
+    state = quiz(deadline=1_800_000_000)
+    right = state.submit([1, 0, UNANSWERED, 2], [1, 1, 0, 2])
+    assert right.tolist() == [True, False, False, True]
+    assert state.score == 2
+    assert [state.is_correct(i) for i in range(4)] == [True, False, False, True]
+    assert state.finished and not state.late
+    with pytest.raises(QuizStateError):
+        state.submit([0, 0, 0, 0], [0, 0, 0, 0])
+
+
+def test_submit_needs_one_answer_per_question():
+    with pytest.raises(QuizStateError):
+        quiz().submit([0, 1], [0, 1, 2, 3])
+
+
+def test_answer_twice_is_refused():
+    state = quiz()
+    state.answer(1, True)
+    with pytest.raises(QuizStateError):
+        state.answer(1, True)
+
+
+def test_snapshot_store_drops_corrupt_rows(tmp_path):
+    store = SnapshotStore(str(tmp_path / "snapshots.db"))
+    state = quiz()
+    store.save(state)
+    assert list(store.load("quiz-1").ids) == [7, 3, 42, 11]
+    with store._conn:
+        store._conn.execute("UPDATE snapshots SET state = ?", (b"garbage",))
+    assert store.load("quiz-1") is None
+    assert store.count() == 0
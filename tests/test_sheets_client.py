@@ -0,0 +1,107 @@
+import pytest
+
+from sheets_client import CircuitBreaker, CircuitOpenError, ManagedSheet
+from storage import FakeSheet
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class BadRequest(Exception):
+    # Shaped like gspread's APIError: the HTTP response rides along
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.response = type("Response", (), {"status_code": status})()
+
+
+def managed(fake, clock, threshold=2, reset_timeout=30.0):
+    breaker = CircuitBreaker(threshold=threshold, reset_timeout=reset_timeout, clock=clock)
+    return ManagedSheet(lambda: fake, max_retries=0, breaker=breaker, clock=clock,
+                        sleep=lambda _: None)
+
+
+def trip(sheet, fake):
+    fake.fail(sheet.breaker.threshold)
+    for _ in range(sheet.breaker.threshold):
+        with pytest.raises(ConnectionError):
+            sheet.row_values(1)
+
+
+def test_opens_after_threshold_and_fails_fast():
+    clock, fake = Clock(), FakeSheet()
+    sheet = managed(fake, clock)
+    trip(sheet, fake)
+    assert sheet.breaker.state == "open"
+    calls = fake.calls
+    with pytest.raises(CircuitOpenError):
+        sheet.row_values(1)
+    assert fake.calls == calls
+
+
+def test_half_open_trial_success_closes():
+    clock, fake = Clock(), FakeSheet()
+    sheet = managed(fake, clock)
+    trip(sheet, fake)
+    clock.now += 30
+    assert sheet.breaker.state == "half_open"
+    assert sheet.row_values(1)
+    assert sheet.breaker.state == "closed"
+
+
+def test_half_open_trial_failure_reopens():
+    clock, fake = Clock(), FakeSheet()
+    sheet = managed(fake, clock)
+    trip(sheet, fake)
+    clock.now += 30
+    fake.fail()
+    with pytest.raises(ConnectionError):
+        sheet.row_values(1)
+    assert sheet.breaker.state == "open"
+    assert sheet.breaker.trips == 1
+
+
+def test_half_open_trial_bad_request_closes():
+    clock, fake = Clock(), FakeSheet()
+    sheet = managed(fake, clock)
+    trip(sheet, fake)
+    clock.now += 30
+    fake.fail(error=BadRequest(400))
+    with pytest.raises(BadRequest):
+        sheet.row_values(1)
+    # Sheets answered, so the trial is over and calls go through again
+    assert sheet.breaker.state == "closed"
+    assert sheet.row_values(1)
+    assert sheet.probe()
+
+
+def test_only_one_trial_while_half_open():
+    clock = Clock()
+    breaker = CircuitBreaker(threshold=1, reset_timeout=30.0, clock=clock)
+    breaker.failure()
+    clock.now += 30
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.failure()
+    assert breaker.state == "open"
+    clock.now += 30
+    assert breaker.allow()
+
+
+def test_half_open_trial_local_error_does_not_close():
+    clock, fake = Clock(), FakeSheet()
+    sheet = managed(fake, clock)
+    trip(sheet, fake)
+    clock.now += 30
+    fake.fail(error=TypeError("bad arguments"))
+    with pytest.raises(TypeError):
+        sheet.row_values(1)
+    # Sheets never answered, so the circuit opens again
+    assert sheet.breaker.state == "open"
+    clock.now += 30
+    assert sheet.row_values(1)
+    assert sheet.breaker.state == "closed"
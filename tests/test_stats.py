@@ -0,0 +1,74 @@
+import time
+
+from analytics import AnswerStore
+from stats import (item_analysis, load_answers, option_rates, quiz_scores, rolling_accuracy,
+                   score_distribution, subject_percentiles)
+
+
+def event(quiz, player, subject, question, chosen, correct, ts):
+    return {
+        'ts': ts, 'player': player, 'quiz': quiz, 'key': f"{subject}:{question}",
+        'subject': subject, 'topic': "", 'difficulty': "", 'question': question,
+        'options': ["a", "b", "c", "d"], 'correct_option': "a", 'chosen': chosen,
+        'correct': correct,
+    }
+
+
+def store(tmp_path, events=()):
+    path = str(tmp_path / "analytics.db")
+    answers = AnswerStore(path)
+    if events:
+        answers.write_events(list(events))
+    return path
+
+
+def populated(tmp_path):
+    now = time.time()
+    events = []
+    # Two Physics quizzes (3/4 and 1/4 right) and one Biology quiz (2/2)
+    for quiz, player, right in (("q1", "Ali", 3), ("q2", "Mei", 1)):
+        for i in range(4):
+            events.append(event(quiz, player, "Physics", f"P{i}", 0 if i < right else 1, i < right,
+                                now - 86400))
+    for i in range(2):
+        events.append(event("q3", "Ali", "Biology", f"B{i}", 0, True, now))
+    return store(tmp_path, events)
+
+
+def test_empty_period_gives_empty_tables(tmp_path):
+    answers = load_answers(store(tmp_path), since=time.time())
+    assert answers.empty
+    scores = quiz_scores(answers)
+    assert scores.empty
+    assert score_distribution(scores).sum() == 0
+    percentiles = subject_percentiles(answers)
+    assert percentiles.empty
+    assert list(percentiles.columns) == ["p10", "p25", "p50", "p75", "p90", "quizzes"]
+    assert item_analysis(answers, min_attempts=1).empty
+    assert option_rates(answers).empty
+    assert rolling_accuracy(answers).empty
+
+
+def test_populated_reports(tmp_path):
+    answers = load_answers(populated(tmp_path))
+    assert len(answers) == 10
+
+    scores = quiz_scores(answers)
+    assert scores['percentage'].to_dict() == {"q1": 75.0, "q2": 25.0, "q3": 100.0}
+    assert score_distribution(scores).sum() == 3
+
+    percentiles = subject_percentiles(answers)
+    assert percentiles.loc["Physics", "p50"] == 50.0
+    assert percentiles.loc["Physics", "quizzes"] == 2
+    assert percentiles.loc["Biology", "p90"] == 100.0
+
+    items = item_analysis(answers, min_attempts=1)
+    assert items.loc["Physics:P0", "difficulty"] == 1.0
+    assert items.loc["Physics:P1", "difficulty"] == 0.5
+
+    rates = option_rates(answers)
+    assert rates.loc["Physics:P1", "option 1"] == 0.5
+
+    trend = rolling_accuracy(answers)
+    assert trend["Physics"].iloc[-1] == 50.0
+    assert trend["Biology"].iloc[-1] == 100.0
@@ -0,0 +1,243 @@
+import atexit
+import glob
+import json
+import os
+import queue
+import random
+import re
+import threading
+import time
+
+import background
+
+
+# ---------- WRITE-BEHIND QUEUE ----------
+# Rows are accepted immediately into a bounded in-memory queue. A single
+# background worker flushes them with one batched call per interval (or as
+# soon as batch_size rows are waiting), retries with exponential backoff and
+# spills to an append-only JSON Lines file when the backend stays unreachable.
+# Spilled rows are replayed ahead of new rows on the next successful flush.
+#
+# Several processes may share one spill path; see the SPILL FILE section for
+# how each spilled row is replayed by exactly one of them.
+class WriteBehindQueue:
+    def __init__(self, flush_rows, max_size=10000, batch_size=200, interval=2.0,
+                 max_retries=4, backoff=0.5, spill_path=None, name="write-behind"):
+        self.flush_rows = flush_rows
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.spill_path = spill_path
+        self._claims = 0
+        # Held before anything is spilled (see _claim_spill)
+        self._owner_lock = background.OwnerLock(spill_path) if spill_path else None
+
+        self._queue = queue.Queue(maxsize=max_size)
+        self._spill_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._stopped = threading.Event()
+
+        self.enqueued = 0
+        self.dropped = 0
+        self.flushed_rows = 0
+        self.flushed_batches = 0
+        self.failed_batches = 0
+        self.spilled_rows = 0
+        self.last_flush_latency = None
+        self.total_flush_latency = 0.0
+
+        self._worker = threading.Thread(target=self._run, name=name, daemon=True)
+        self._worker.start()
+        atexit.register(self.close)
+        background.register(self)
+
+    @property
+    def depth(self):
+        return self._queue.qsize()
+
+    def put(self, row):
+        self._idle.clear()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            with self._stats_lock:
+                self.dropped += 1
+            return False
+        with self._stats_lock:
+            self.enqueued += 1
+        return True
+
+    def put_many(self, rows):
+        return all([self.put(row) for row in rows])
+
+    def stats(self):
+        with self._stats_lock:
+            avg = (self.total_flush_latency / self.flushed_batches) if self.flushed_batches else None
+            return {
+                'depth': self.depth,
+                'enqueued': self.enqueued,
+                'dropped': self.dropped,
+                'flushed_rows': self.flushed_rows,
+                'flushed_batches': self.flushed_batches,
+                'failed_batches': self.failed_batches,
+                'spilled_rows': self.spilled_rows,
+                'pending_spill': self._spill_exists(),
+                'last_flush_latency': self.last_flush_latency,
+                'avg_flush_latency': avg,
+            }
+
+    def flush(self, timeout=None):
+        # Block until everything enqueued so far has been written or spilled
+        return self._idle.wait(timeout)
+
+    def close(self, timeout=10.0):
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        self._worker.join(timeout)
+
+    # ---------- WORKER ----------
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch or self._spill_exists():
+                self._flush(batch)
+            if self._queue.empty():
+                self._idle.set()
+            if self._stopped.is_set() and self._queue.empty():
+                return
+
+    def _collect(self):
+        batch = []
+        deadline = time.monotonic() + self.interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or (self._stopped.is_set() and self._queue.empty()):
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _flush(self, batch):
+        claimed = self._claim_spill()
+        spilled = self._read_spill(claimed)
+        rows = spilled + batch
+        for attempt in range(self.max_retries + 1):
+            started = time.perf_counter()
+            try:
+                self.flush_rows(rows)
+            except Exception:
+                if attempt == self.max_retries or self._stopped.is_set():
+                    break
+                delay = self.backoff * (2 ** attempt)
+                time.sleep(delay + random.uniform(0, delay))
+                continue
+            latency = time.perf_counter() - started
+            if claimed:
+                self._clear_spill(claimed)
+            with self._stats_lock:
+                self.flushed_rows += len(rows)
+                self.flushed_batches += 1
+                self.last_flush_latency = latency
+                self.total_flush_latency += latency
+            return True
+
+        with self._stats_lock:
+            self.failed_batches += 1
+        # Rows already on disk stay there; only the new batch is appended
+        self._spill(batch)
+        return False
+
+    # ---------- SPILL FILE ----------
+    # Several processes may share one spill path. Each spills into a file of
+    # its own, <spill_path>.<pid>.0, so no two processes ever append to the
+    # same file. A file is replayed only by the process that owns it and is
+    # deleted once its rows are written. Files of a process that is no
+    # longer running (see OwnerLock in background.py) are adopted by renaming
+    # them to <spill_path>.<pid>.<n>; a live owner's files are never taken,
+    # however long its flushes take. A rename is atomic, so when processes
+    # race for the same file only one of them gets it. A plain <spill_path>
+    # (from an older version) is adopted the same way.
+    def _own_spill(self):
+        return f"{self.spill_path}.{os.getpid()}.0"
+
+    def _spill_files(self):
+        pattern = re.compile(re.escape(self.spill_path) + r"\.\d+\.\d+")
+        files = [p for p in glob.glob(glob.escape(self.spill_path) + ".*") if pattern.fullmatch(p)]
+        if os.path.exists(self.spill_path):
+            files.append(self.spill_path)
+        return files
+
+    def _spill_exists(self):
+        return bool(self.spill_path) and bool(self._spill_files())
+
+    def _spill(self, rows):
+        if not rows:
+            return
+        if not self.spill_path:
+            with self._stats_lock:
+                self.dropped += len(rows)
+            return
+        with self._spill_lock:
+            with open(self._own_spill(), "a", encoding="utf-8") as f:
+                for row in rows:
+                    f.write(json.dumps(row, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        with self._stats_lock:
+            self.spilled_rows += len(rows)
+
+    # The spill files this process should replay now
+    def _claim_spill(self):
+        if not self.spill_path:
+            return []
+        claimed = []
+        own = f"{self.spill_path}.{os.getpid()}."
+        with self._spill_lock:
+            for path in sorted(self._spill_files()):
+                if not path.startswith(own):
+                    if path != self.spill_path and self._owner_lock.alive(self._spill_owner(path)):
+                        continue
+                    self._claims += 1
+                    target = f"{own}{self._claims}"
+                    try:
+                        os.rename(path, target)
+                    except OSError:
+                        # Gone (another process adopted it) or, on Windows, still open
+                        continue
+                    path = target
+                claimed.append(path)
+            self._owner_lock.prune()
+        return claimed
+
+    def _spill_owner(self, path):
+        return int(path[len(self.spill_path) + 1:].split(".")[0])
+
+    def _read_spill(self, paths):
+        rows = []
+        with self._spill_lock:
+            for path in paths:
+                with open(path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        line = line.strip()
+                        if not line:
+                            continue
+                        try:
+                            rows.append(json.loads(line))
+                        except ValueError:
+                            # A torn final line from a crash mid-write
+                            pass
+        return rows
+
+    def _clear_spill(self, paths):
+        with self._spill_lock:
+            for path in paths:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass